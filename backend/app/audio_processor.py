@@ -1,8 +1,12 @@
 import os
+import asyncio
 import logging
+import shutil
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Optional
 from pathlib import Path
+from app.file_utils import fast_copy
 
 logger = logging.getLogger(__name__)
 
@@ -11,14 +15,129 @@ AUDIO_BASE = Path(__file__).resolve().parent.parent.parent   # backend/..
 UPLOADS_DIR = AUDIO_BASE / "uploads"
 UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
 
+# Resolve ffmpeg/ffprobe once; None means the binary is not installed
+FFMPEG_BIN = shutil.which('ffmpeg')
+FFPROBE_BIN = shutil.which('ffprobe')
+
+# With an absolute executable and close_fds=False, subprocess launches children via
+# posix_spawn (vfork) instead of fork+exec, avoiding a page-table copy of this
+# process on every ffmpeg/ffprobe call. Python opens fds non-inheritable, so
+# nothing leaks into the child.
+_SPAWN_KWARGS = {'close_fds': False}
+
+# Static parts of the conversion command. Quiet flags: skip the banner, progress
+# stats and per-file info ffmpeg would otherwise write (and we'd buffer) on every
+# run, and never read stdin
+_QUIET_ARGS = ('-hide_banner', '-nostats', '-loglevel', 'error', '-nostdin')
+_HWACCEL_ARGS = ('-hwaccel', 'cuda')  # Offload decoding of any video stream (e.g. cover art) to NVDEC
+
+# libmp3lame encode presets; compression_level is LAME's algorithm quality
+# (0 = best/slowest, 9 = fastest), the bitrate is the same for all presets
+ENCODE_PRESETS = {
+    'fast': ('-codec:a', 'libmp3lame', '-b:a', '128k', '-compression_level', '7'),
+    'balanced': ('-codec:a', 'libmp3lame', '-b:a', '128k', '-compression_level', '5'),
+    'quality': ('-codec:a', 'libmp3lame', '-b:a', '128k', '-compression_level', '2'),
+}
+DEFAULT_ENCODE_PRESET = 'fast'
+
+# Conversion targets: codec -> (output extension, encoder args). MP3 uses the presets above;
+# Vorbis encodes markedly faster than LAME at similar quality and Chromium plays it natively
+TARGET_CODECS = {
+    'libmp3lame': ('.mp3', None),
+    'libvorbis': ('.ogg', ('-codec:a', 'libvorbis', '-q:a', '5')),
+    'libopus': ('.ogg', ('-codec:a', 'libopus', '-b:a', '96k')),
+}
+DEFAULT_TARGET_CODEC = 'libvorbis'
+
+# Formats Remotion (Chromium) plays directly, so uploads in them skip ffmpeg
+PASSTHROUGH_FORMATS = frozenset(('.mp3', '.wav'))
+
+def sniff_audio_format(path: str) -> Optional[str]:
+    """Identify MP3/WAV content from its magic bytes; None if it's neither."""
+    with open(path, 'rb') as f:
+        head = f.read(12)
+    if head[:3] == b'ID3':
+        return '.mp3'
+    # MPEG audio frame sync (11 set bits) with layer bits = Layer III
+    if len(head) >= 2 and head[0] == 0xFF and (head[1] & 0xE6) == 0xE2:
+        return '.mp3'
+    if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+        return '.wav'
+    return None
+
+def _probe_duration(path: str) -> Optional[float]:
+    """Return the audio duration via ffprobe."""
+    if FFPROBE_BIN is None:
+        return None
+    try:
+        cmd = [FFPROBE_BIN, '-v', 'quiet', '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', path]
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=10, **_SPAWN_KWARGS)
+        if result.returncode == 0:
+            return float(result.stdout.strip())
+    except (subprocess.TimeoutExpired, subprocess.CalledProcessError, FileNotFoundError, ValueError):
+        logger.debug(f"Could not get duration for {path} - ffprobe not available or failed")
+    return None
+
 class AudioProcessor:    
-    def __init__(self):
-        self.supported_formats = ['.mp3', '.wav', '.m4a', '.aac', '.ogg']
+    # Ordered for error messages; the frozenset gives O(1) membership checks
+    SUPPORTED_FORMATS_ORDERED = ('.mp3', '.wav', '.m4a', '.aac', '.ogg')
+    SUPPORTED_FORMATS = frozenset(SUPPORTED_FORMATS_ORDERED)
+
+    # Cached ffmpeg hardware acceleration probe (None = not probed yet)
+    _hwaccel_available: Optional[bool] = None
+
+    def __init__(self, encode_preset: Optional[str] = None, target_codec: Optional[str] = None):
+        self.encode_preset = encode_preset or os.getenv("AUDIO_ENCODE_PRESET", DEFAULT_ENCODE_PRESET)
+        if self.encode_preset not in ENCODE_PRESETS:
+            logger.warning(f"Unknown audio encode preset '{self.encode_preset}', using '{DEFAULT_ENCODE_PRESET}'")
+            self.encode_preset = DEFAULT_ENCODE_PRESET
+        self.target_codec = target_codec or os.getenv("AUDIO_TARGET_CODEC", DEFAULT_TARGET_CODEC)
+        if self.target_codec not in TARGET_CODECS:
+            logger.warning(f"Unknown audio target codec '{self.target_codec}', using '{DEFAULT_TARGET_CODEC}'")
+            self.target_codec = DEFAULT_TARGET_CODEC
+        self.target_ext = TARGET_CODECS[self.target_codec][0]
+        # Encoder args per target codec; -vn: drop cover art and other video streams (the ogg
+        # muxer would otherwise try to encode them as Theora); -y: overwrite output
+        self._codec_args = {
+            codec: (*(args or ENCODE_PRESETS[self.encode_preset]), '-vn', '-y')
+            for codec, (_, args) in TARGET_CODECS.items()
+        }
         self.max_file_size = 50 * 1024 * 1024  # 50MB
+        self._use_hwaccel = self._check_hw_accel_available()
+        self._ffmpeg_prefix = (FFMPEG_BIN, *_QUIET_ARGS, *(_HWACCEL_ARGS if self._use_hwaccel else ()))
+        # Bound concurrent ffmpeg transcodes to the number of CPU cores
+        self._semaphore = asyncio.Semaphore(os.cpu_count() or 1)
+        # Blocking audio work (ffprobe, file copies) shares one pool sized to the cores
+        self._executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix="audio")
+
+    async def run_blocking(self, func, *args):
+        """Run a blocking call on the audio thread pool."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    @classmethod
+    def _check_hw_accel_available(cls) -> bool:
+        """Probe ffmpeg once for CUDA/NVDEC support and cache the result on the class."""
+        if cls._hwaccel_available is None:
+            if FFMPEG_BIN is None:
+                cls._hwaccel_available = False
+                return False
+            try:
+                result = subprocess.run([FFMPEG_BIN, '-hide_banner', '-hwaccels'], capture_output=True, text=True, timeout=10, **_SPAWN_KWARGS)
+                cls._hwaccel_available = result.returncode == 0 and 'cuda' in result.stdout.split()
+            except (subprocess.TimeoutExpired, FileNotFoundError, OSError):
+                cls._hwaccel_available = False
+            logger.info(f"ffmpeg CUDA hardware acceleration available: {cls._hwaccel_available}")
+        return cls._hwaccel_available
     
     def validate_audio(self, file_path: str) -> Dict[str, any]:
         try:
-            if not os.path.exists(file_path):
+            # Single stat() for existence, size and mtime
+            try:
+                st = os.stat(file_path)
+            except FileNotFoundError:
                 return {'valid': False, 'error': 'File not found'}
             
             # Check file extension - be more robust
@@ -32,27 +151,22 @@ class AudioProcessor:
                     return {'valid': False, 'error': 'No file extension found'}
             
             # Check if extension is supported
-            if file_ext not in self.supported_formats:
-                return {'valid': False, 'error': f'Unsupported format: {file_ext}. Supported formats: {self.supported_formats}'}
+            if file_ext not in self.SUPPORTED_FORMATS:
+                return {'valid': False, 'error': f'Unsupported format: {file_ext}. Supported formats: {list(self.SUPPORTED_FORMATS_ORDERED)}'}
             
             # Check file size (max 50MB)
-            file_size = os.path.getsize(file_path)
+            file_size = st.st_size
             if file_size > self.max_file_size:
                 return {'valid': False, 'error': f'File too large (max {self.max_file_size // (1024 * 1024)}MB)'}
             
             if file_size == 0:
                 return {'valid': False, 'error': 'File is empty'}
             
+            # Check the actual content; files already playable as-is need no conversion
+            detected_format = sniff_audio_format(file_path)
+            
             # Try to get basic audio info using ffprobe if available
-            duration = None
-            try:
-                import subprocess
-                cmd = ['ffprobe', '-v', 'quiet', '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', file_path]
-                result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-                if result.returncode == 0:
-                    duration = float(result.stdout.strip())
-            except (subprocess.TimeoutExpired, subprocess.CalledProcessError, FileNotFoundError, ValueError):
-                logger.debug(f"Could not get duration for {file_path} - ffprobe not available or failed")
+            duration = _probe_duration(file_path)
             
             # Basic validation passed
             validation_result = {
@@ -60,7 +174,8 @@ class AudioProcessor:
                 'format': file_ext,
                 'size_mb': round(file_size / (1024 * 1024), 2),
                 'size_bytes': file_size,
-                'needs_conversion': file_ext != '.mp3',
+                'detected_format': detected_format,
+                'needs_conversion': detected_format not in PASSTHROUGH_FORMATS,
                 'duration_seconds': duration
             }
             
@@ -71,34 +186,59 @@ class AudioProcessor:
             logger.error(f"Audio validation error for {file_path}: {str(e)}")
             return {'valid': False, 'error': f'Validation error: {str(e)}'}
     
-    def convert_to_mp3(self, input_path: str, output_filename: str) -> Optional[str]:
+    async def convert_to_mp3(self, input_path: str, output_filename: str, input_format: Optional[str] = None) -> Optional[str]:
+        return await self.convert_audio(input_path, output_filename, input_format, target_codec='libmp3lame')
+
+    async def convert_audio(self, input_path: str, output_filename: str, input_format: Optional[str] = None, target_codec: Optional[str] = None) -> Optional[str]:
+        """Convert to target_codec (default: self.target_codec); output_filename's extension is set to match."""
+        codec = target_codec or self.target_codec
+        target_ext = TARGET_CODECS[codec][0]
         try:
             # Use consistent uploads directory
+            output_filename = os.path.splitext(output_filename)[0] + target_ext
             output_path = UPLOADS_DIR / output_filename
             
-            # Check if input file exists and is readable
-            input_file = Path(input_path)
-            if not input_file.exists():
+            # Check if input file exists and is readable (one open() instead of stat + access)
+            try:
+                open(input_path, 'rb').close()
+            except FileNotFoundError:
                 logger.error(f"Input file does not exist: {input_path}")
                 return None
-                
-            if not os.access(input_path, os.R_OK):
+            except PermissionError:
                 logger.error(f"Input file is not readable: {input_path}")
                 return None
             
+            # Input already in the target format needs no transcode; copy at disk speed instead
+            if (input_format or Path(input_path).suffix).lower() == target_ext:
+                logger.info(f"Input is already {target_ext}, copying without re-encoding: {input_path}")
+                await self.run_blocking(fast_copy, input_path, output_path)
+                return str(output_path)
+
+            if FFMPEG_BIN is None:
+                logger.warning("ffmpeg not found, copying file without conversion")
+                await self.run_blocking(fast_copy, input_path, output_path)
+                return str(output_path)
+
             # Simple conversion using ffmpeg (requires ffmpeg to be installed)
-            cmd = [
-                'ffmpeg', '-i', str(input_path), 
-                '-codec:a', 'mp3', 
-                '-b:a', '128k',
-                '-y',  # Overwrite output
-                str(output_path)
-            ]
+            cmd = (*self._ffmpeg_prefix, '-i', str(input_path), *self._codec_args[codec], str(output_path))
             
-            logger.info(f"Running ffmpeg command: {' '.join(cmd)}")
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(f"Running ffmpeg command: {' '.join(cmd)}")
+            async with self._semaphore:
+                process = await asyncio.create_subprocess_exec(
+                    *cmd,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    **_SPAWN_KWARGS
+                )
+                try:
+                    _, stderr = await asyncio.wait_for(process.communicate(), timeout=60)
+                except asyncio.TimeoutError:
+                    process.kill()
+                    await process.wait()
+                    raise
             
-            if result.returncode == 0:
+            if process.returncode == 0:
                 logger.info(f"Successfully converted audio to: {output_path}")
                 if output_path.exists():
                     return str(output_path)
@@ -106,10 +246,9 @@ class AudioProcessor:
                     logger.error(f"Conversion succeeded but output file not found: {output_path}")
                     return None
             else:
-                logger.error(f"ffmpeg conversion failed: {result.stderr}")
+                logger.error(f"ffmpeg conversion failed: {stderr.decode(errors='replace')}")
                 # If ffmpeg fails, just copy the file
-                import shutil
-                shutil.copy2(input_path, output_path)
+                await self.run_blocking(fast_copy, input_path, output_path)
                 if output_path.exists():
                     logger.info(f"Copied original file to: {output_path}")
                     return str(output_path)
@@ -117,13 +256,12 @@ class AudioProcessor:
                     logger.error(f"Failed to copy file to: {output_path}")
                     return None
                 
-        except subprocess.TimeoutExpired:
+        except asyncio.TimeoutError:
             logger.error(f"ffmpeg conversion timed out for: {input_path}")
             # Try to copy the file instead
             try:
-                import shutil
                 output_path = UPLOADS_DIR / output_filename
-                shutil.copy2(input_path, output_path)
+                await self.run_blocking(fast_copy, input_path, output_path)
                 return str(output_path)
             except Exception as e:
                 logger.error(f"File copy after timeout failed: {str(e)}")
@@ -132,9 +270,8 @@ class AudioProcessor:
             # ffmpeg not installed, just copy the file
             logger.warning("ffmpeg not found, copying file without conversion")
             try:
-                import shutil
                 output_path = UPLOADS_DIR / output_filename
-                shutil.copy2(input_path, output_path)
+                await self.run_blocking(fast_copy, input_path, output_path)
                 return str(output_path)
             except Exception as e:
                 logger.error(f"File copy failed: {str(e)}")
@@ -143,9 +280,8 @@ class AudioProcessor:
             logger.error(f"Audio conversion error for {input_path}: {str(e)}")
             # Try to copy the file as a last resort
             try:
-                import shutil
                 output_path = UPLOADS_DIR / output_filename
-                shutil.copy2(input_path, output_path)
+                await self.run_blocking(fast_copy, input_path, output_path)
                 return str(output_path)
             except Exception as copy_error:
                 logger.error(f"Final file copy failed: {str(copy_error)}")
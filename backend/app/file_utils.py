@@ -0,0 +1,155 @@
+import os
+import sys
+import logging
+import uuid
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Reused buffer size for the userspace copy fallback
+COPY_BUFSIZE = 1024 * 1024
+
+# Linux ioctl that shares src's extents with dst (btrfs, xfs, bcachefs, ...)
+FICLONE = 0x40049409
+
+_libc = None
+
+
+def _clonefile(src, dst) -> bool:
+    """macOS clonefile(2) on APFS; dst must not exist."""
+    global _libc
+    try:
+        if _libc is None:
+            import ctypes
+            _libc = ctypes.CDLL(None, use_errno=True)
+        if os.path.lexists(dst):
+            os.unlink(dst)
+        return _libc.clonefile(os.fsencode(src), os.fsencode(dst), 0) == 0
+    except (AttributeError, OSError):
+        return False
+
+
+def try_reflink(src, dst) -> bool:
+    """Clone src to dst as a copy-on-write reflink; returns False if the filesystem can't."""
+    if sys.platform == 'darwin':
+        return _clonefile(src, dst)
+    if fcntl is None or not sys.platform.startswith('linux'):
+        return False
+    try:
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        return True
+    except OSError:
+        return False
+
+
+def fast_copy(src, dst, size: Optional[int] = None) -> None:
+    """Copy src to dst in-kernel (copy_file_range, then sendfile), falling back to a buffered copy.
+
+    Pass size if the caller has already stat()ed src, to skip the fstat.
+    """
+    try:
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            in_fd, out_fd = fsrc.fileno(), fdst.fileno()
+            if size is None:
+                size = os.fstat(in_fd).st_size
+            offset = 0
+            try:
+                while offset < size:
+                    copied = os.copy_file_range(in_fd, out_fd, size - offset)
+                    if copied == 0:
+                        break
+                    offset += copied
+            except (AttributeError, OSError):
+                # copy_file_range is Linux-only and may reject cross-device copies
+                while offset < size:
+                    sent = os.sendfile(out_fd, in_fd, offset, size - offset)
+                    if sent == 0:
+                        break
+                    offset += sent
+            if offset == size:
+                return
+    except (AttributeError, OSError) as e:
+        logger.debug(f"Zero-copy failed for {src} -> {dst}, using buffered copy: {e}")
+    readinto_copy(src, dst)
+
+
+def readinto_copy(src, dst) -> None:
+    """Unbuffered copy through one reused buffer, with no per-chunk bytes allocations."""
+    buf = bytearray(COPY_BUFSIZE)
+    mv = memoryview(buf)
+    with open(src, 'rb', buffering=0) as fsrc, open(dst, 'wb', buffering=0) as fdst:
+        while True:
+            n = fsrc.readinto(mv)
+            if not n:
+                break
+            # Raw writes may be partial
+            written = 0
+            while written < n:
+                written += fdst.write(mv[written:n])
+
+
+def clone_or_copy(src, dst) -> None:
+    """Reflink src to dst when supported (O(1) on CoW filesystems), otherwise fast_copy."""
+    if not try_reflink(src, dst):
+        fast_copy(src, dst)
+
+
+def _link_or_copy_to(src, dst) -> None:
+    """Create dst from src: hardlink, then symlink, then clone_or_copy. dst must not exist."""
+    try:
+        # Free on the same filesystem
+        os.link(src, dst)
+        return
+    except OSError as e:
+        logger.debug(f"Hardlink failed for {src} -> {dst}: {e}")
+    try:
+        # Works across filesystems; target must stay absolute for readers elsewhere
+        os.symlink(os.path.abspath(src), dst)
+        return
+    except OSError as e:
+        logger.debug(f"Symlink failed for {src} -> {dst}: {e}")
+    clone_or_copy(src, dst)
+
+
+def link_or_copy(src, dst) -> None:
+    """Expose src at dst without copying bytes: hardlink, then symlink, then clone_or_copy.
+
+    The link or copy is built under a unique temporary name and renamed onto dst, so
+    concurrent callers never open an existing dst (possibly a hardlink to src) for writing.
+    """
+    tmp = f"{dst}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        _link_or_copy_to(src, tmp)
+        os.replace(tmp, dst)
+    finally:
+        # Also covers rename(2) leaving tmp in place when dst already links to the same inode
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+
+
+def remove_stale_files(directory, cutoff: float, prefix="") -> int:
+    """Delete files and symlinks in directory whose names start with prefix (a string or
+    tuple of strings) and whose (link) mtime is before cutoff; returns how many were removed."""
+    removed = 0
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if not entry.name.startswith(prefix):
+                    continue
+                try:
+                    if (entry.is_file(follow_symlinks=False) or entry.is_symlink()) and entry.stat(follow_symlinks=False).st_mtime < cutoff:
+                        os.unlink(entry.path)
+                        removed += 1
+                except OSError:
+                    pass
+    except FileNotFoundError:
+        pass
+    return removed
@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+# Finished jobs are kept this long for polling, then dropped
+JOB_TTL_SECONDS = 3600
+
+# (queue, job id) of the job running in the current task, for report_progress()
+_current_job: ContextVar[Optional[Tuple["JobQueue", str]]] = ContextVar("current_job", default=None)
+
+
+def report_progress(step: str) -> None:
+    """Record the current pipeline step of the running job; a no-op outside a job."""
+    current = _current_job.get()
+    if current is not None:
+        queue, job_id = current
+        queue._update(job_id, step=step)
+
+
+class JobQueue:
+    """In-process background job queue for the long image/video pipelines.
+
+    Jobs run on a fixed number of worker tasks on the server's event loop, so
+    a submit returns immediately and clients poll GET /jobs/{id}. State lives in
+    memory: it is lost on restart and not shared between server processes.
+    """
+
+    def __init__(self, num_workers: Optional[int] = None):
+        self.num_workers = num_workers or int(os.getenv("JOB_WORKERS", "2"))
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        # Set and replaced whenever a job changes, to wake watch() streams
+        self._changed: Dict[str, asyncio.Event] = {}
+
+    def start(self) -> None:
+        """Start the worker tasks; must be called from the running event loop."""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.num_workers)]
+        logger.info(f"Job queue started with {self.num_workers} workers")
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def enqueue(self, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> str:
+        """Queue func(*args, **kwargs) and return its job id."""
+        if self._queue is None:
+            raise RuntimeError("Job queue is not started")
+        self._purge_expired()
+        job_id = str(uuid.uuid4())
+        self._jobs[job_id] = {
+            "job_id": job_id,
+            "status": "queued",
+            "step": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+        self._changed[job_id] = asyncio.Event()
+        self._queue.put_nowait((job_id, func, args, kwargs))
+        logger.info(f"[{job_id}] Queued {func.__name__} (queue size {self._queue.qsize()})")
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self._jobs.get(job_id)
+
+    async def watch(self, job_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """Yield the job record now and after every change, until the job finishes."""
+        while True:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            # Taken before yielding so a change made meanwhile is not missed
+            changed = self._changed.get(job_id)
+            yield job
+            if job["finished_at"] is not None or changed is None:
+                return
+            await changed.wait()
+
+    def _update(self, job_id: str, **fields: Any) -> None:
+        job = self._jobs.get(job_id)
+        if job is None:
+            return
+        job.update(fields)
+        changed = self._changed.get(job_id)
+        if changed is not None:
+            changed.set()
+            self._changed[job_id] = asyncio.Event()
+
+    async def _worker(self) -> None:
+        while True:
+            job_id, func, args, kwargs = await self._queue.get()
+            job = self._jobs.get(job_id)
+            try:
+                if job is None:
+                    continue
+                self._update(job_id, status="running", started_at=time.time())
+                logger.info(f"[{job_id}] Running {func.__name__}")
+                token = _current_job.set((self, job_id))
+                outcome: Dict[str, Any] = {}
+                try:
+                    outcome = {"result": await func(*args, **kwargs), "status": "completed"}
+                except asyncio.CancelledError:
+                    outcome = {"status": "failed", "error": "Server shut down before the job finished"}
+                    raise
+                except HTTPException as e:
+                    outcome = {"status": "failed", "error": e.detail}
+                except Exception as e:
+                    logger.error(f"[{job_id}] Job failed: {str(e)}")
+                    outcome = {"status": "failed", "error": str(e)}
+                finally:
+                    _current_job.reset(token)
+                    self._update(job_id, finished_at=time.time(), **outcome)
+                    logger.info(f"[{job_id}] Job {job['status']} in {job['finished_at'] - job['started_at']:.1f}s")
+            finally:
+                self._queue.task_done()
+
+    def _purge_expired(self) -> None:
+        cutoff = time.time() - JOB_TTL_SECONDS
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["finished_at"] is not None and job["finished_at"] < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+            self._changed.pop(job_id, None)
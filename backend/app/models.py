@@ -1,6 +1,8 @@
-from pydantic import BaseModel
-from typing import List, Optional
-from fastapi import UploadFile
+import orjson
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError, field_validator
+from typing import Annotated, List, Optional
+from fastapi import UploadFile, Form
+from fastapi.exceptions import RequestValidationError
 
 class VideoGenerationRequest(BaseModel):
     prompt: str
@@ -16,7 +18,22 @@ class GeneratedImage(BaseModel):
     age: str
     year: str
     call_id: Optional[str] = None  
-    base64_data: Optional[str] = None  
+    # Internal only: never serialized into API responses (can be several MB per image)
+    base64_data: Optional[str] = Field(default=None, exclude=True)
+
+class GeneratedImageIn(GeneratedImage):
+    """An image sent back by the frontend; caption may be missing and age/year may be numbers."""
+    caption: str = ''
+    age: str = ''
+    year: str = ''
+
+    @field_validator("age", "year", mode="before")
+    @classmethod
+    def _to_str(cls, v):
+        return v if isinstance(v, str) else str(v)
+
+# Built once: parses a JSON array of images straight into GeneratedImage objects
+GENERATED_IMAGE_LIST_ADAPTER = TypeAdapter(List[GeneratedImageIn])
 
 class VideoGenerationResponse(BaseModel):
     video_url: str
@@ -31,10 +48,48 @@ class IterativeAgingRequest(BaseModel):
     end_age: int = 60
     age_increment: int = 20
 
+class AgesIn(BaseModel):
+    """Ages from a form field, either comma separated ("20,40,60") or a JSON array."""
+    ages: List[Annotated[int, Field(ge=0, le=120)]] = Field(..., min_length=2, max_length=20)
+
+    @field_validator("ages", mode="before")
+    @classmethod
+    def _parse_ages(cls, v):
+        if isinstance(v, str):
+            v = v.strip()
+            if v.startswith("["):
+                return orjson.loads(v)
+            return [age.strip() for age in v.split(",")]
+        return v
+
 class DynamicVideoRequest(BaseModel):
     prompt: str
-    num_images: int = 3
-    title: str = "My Story"
+    num_images: int = Field(3, ge=1, le=20)
+    title: str = "My Aging Journey"
     name: str = "Through the Years"
-    duration_per_image: float = 2.0
-    transition_duration: float = 0.5
+    duration_per_image: float = Field(2.0, ge=0.5, le=10)  # seconds per image
+    transition_duration: float = Field(0.5, ge=0, le=3)  # seconds for transitions
+
+    @classmethod
+    def as_form(
+        cls,
+        prompt: str = Form(...),
+        num_images: int = Form(3),
+        title: str = Form("My Aging Journey"),
+        name: str = Form("Through the Years"),
+        duration_per_image: float = Form(2.0),
+        transition_duration: float = Form(0.5)
+    ) -> "DynamicVideoRequest":
+        """FastAPI dependency that binds and validates the multipart form fields."""
+        try:
+            return cls(
+                prompt=prompt,
+                num_images=num_images,
+                title=title,
+                name=name,
+                duration_per_image=duration_per_image,
+                transition_duration=transition_duration
+            )
+        except ValidationError as e:
+            # Report as a normal 422 form validation error rather than a 500
+            raise RequestValidationError([{**err, "loc": ("body", *err["loc"])} for err in e.errors()])
@@ -2,10 +2,15 @@ import os
 import base64
 import time
 import logging
-from openai import OpenAI
-from typing import List, Optional
+import hashlib
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from openai import AsyncOpenAI
+from typing import Dict, List, Optional, Tuple
 from app.models import GeneratedImage
 import asyncio
+import concurrent.futures
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -13,12 +18,54 @@ load_dotenv()
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Maximum number of GPT-5 image requests in flight per service instance
+MAX_CONCURRENT_GENERATIONS = int(os.getenv("OPENAI_CONCURRENCY", "4"))
+# Per-attempt timeout (seconds) and retries; the client retries 429s and 5xx with exponential backoff
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "300"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+# Deadline for a whole generation (base call, then the follow-ups), retries included.
+# main.py derives its image step timeout from this, so an age that runs out of time is
+# skipped and the images made so far are still returned.
+IMAGE_GENERATION_BUDGET = 1050
+
+# Default ages for small image counts; larger counts are spread evenly over 20-90
+AGE_TABLE = {
+    1: (25,),
+    2: (20, 60),
+    3: (20, 40, 60),
+    4: (20, 35, 50, 65),
+    5: (20, 30, 40, 50, 60),
+    6: (20, 30, 40, 50, 60, 70),
+    7: (20, 25, 35, 45, 55, 65, 75),
+    8: (20, 25, 35, 45, 55, 65, 75, 85),
+    9: (20, 25, 30, 40, 50, 60, 70, 80, 90),
+}
+
+# Finished image sets are reused for identical (prompt, ages) requests for this long;
+# IMAGE_CACHE_TTL=0 turns the cache off
+IMAGE_CACHE_TTL = float(os.getenv("IMAGE_CACHE_TTL", "3600"))
+IMAGE_CACHE_SIZE = 256
+
+# Base64 characters decoded per write; a multiple of 4 that yields ~64KB of bytes
+B64_CHUNK_CHARS = 87380
+
+# Use unified directory constants (same as main.py)
+BASE_DIR = Path(__file__).resolve().parent.parent.parent   # backend/..
+GENERATED_DIR = BASE_DIR / "generated"
+
 class OpenAIService:
     def __init__(self):
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise ValueError("OPENAI_API_KEY not found in environment variables")
-        self.client = OpenAI(api_key=api_key)
+        self.client = AsyncOpenAI(api_key=api_key, timeout=OPENAI_TIMEOUT, max_retries=OPENAI_MAX_RETRIES)
+        GENERATED_DIR.mkdir(parents=True, exist_ok=True)
+        self._generation_semaphore = asyncio.Semaphore(MAX_CONCURRENT_GENERATIONS)
+        self._io_executor = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix="image-io")
+        # Cache key -> (expiry time, images), oldest first
+        self._image_cache: "OrderedDict[str, Tuple[float, List[GeneratedImage]]]" = OrderedDict()
+        # Cache key -> future resolved when the generation producing it finishes
+        self._inflight_generations: Dict[str, asyncio.Future] = {}
 
     def _create_safe_prompt(self, base_prompt: str, age: int, is_base: bool = True, age_difference: int = 0) -> str:
         """Create a flexible prompt that incorporates the user's original request."""
@@ -32,9 +79,13 @@ class OpenAIService:
             # For progression images, modify the original prompt with age difference
             return f"{clean_prompt}, same person but {age_difference} years older (now aged {age}), natural aging progression, natural lighting, high quality"
 
+    @staticmethod
+    def _spread_ages(num_images: int) -> List[int]:
+        """Distribute ages evenly from 20 to 90."""
+        age_increment = (90 - 20) / (num_images - 1)
+        return [int(20 + i * age_increment) for i in range(num_images)]
+
     async def generate_images_and_captions(self, prompt: str, num_images: int, custom_ages: List[int] = None, starting_age: int = 20, age_gap: int = 15) -> List[GeneratedImage]:
-        generated_images = []
-        
         # Use custom ages if provided, otherwise use dynamic age calculation
         if custom_ages:
             ages = custom_ages
@@ -43,29 +94,57 @@ class OpenAIService:
             ages = [starting_age + (i * age_gap) for i in range(num_images)]
         else:
             # Default dynamic age calculation based on number of images
-            if num_images == 1:
-                ages = [25]
-            elif num_images == 2:
-                ages = [20, 60]
-            elif num_images == 3:
-                ages = [20, 40, 60]
-            elif num_images == 4:
-                ages = [20, 35, 50, 65]
-            elif num_images == 5:
-                ages = [20, 30, 40, 50, 60]
-            elif num_images == 6:
-                ages = [20, 30, 40, 50, 60, 70]
-            elif num_images == 7:
-                ages = [20, 25, 35, 45, 55, 65, 75]
-            elif num_images == 8:
-                ages = [20, 25, 35, 45, 55, 65, 75, 85]
-            elif num_images == 9:
-                ages = [20, 25, 30, 40, 50, 60, 70, 80, 90]
-            else:  # 10 or more images
-                # Calculate ages evenly distributed from 20 to 90
-                age_range = 90 - 20
-                age_increment = age_range / (num_images - 1)
-                ages = [int(20 + i * age_increment) for i in range(num_images)]
+            ages = list(AGE_TABLE.get(num_images) or self._spread_ages(num_images))
+        
+        if IMAGE_CACHE_TTL <= 0:
+            return await self._generate_for_ages(prompt, ages)
+        
+        key = hashlib.sha256(f"{prompt}\0{ages}".encode()).hexdigest()
+        while True:
+            cached = self._cached_images(key)
+            if cached is not None:
+                logger.info(f"Reusing cached images for ages: {ages}")
+                return cached
+            pending = self._inflight_generations.get(key)
+            if pending is None:
+                break
+            # Identical generation already running; wait for it, then read the cache
+            # (or generate ourselves if it failed). Shielded so our cancellation
+            # doesn't cancel the other request's future.
+            logger.info("Identical image generation in progress, waiting for it")
+            await asyncio.shield(pending)
+        
+        inflight = asyncio.get_running_loop().create_future()
+        self._inflight_generations[key] = inflight
+        try:
+            generated_images = await self._generate_for_ages(prompt, ages)
+            # A partial set is not cached, so a retry can fill in the missing ages
+            if len(generated_images) == len(ages):
+                self._image_cache[key] = (time.monotonic() + IMAGE_CACHE_TTL, generated_images)
+                self._image_cache.move_to_end(key)
+                while len(self._image_cache) > IMAGE_CACHE_SIZE:
+                    self._image_cache.popitem(last=False)
+            return [img.model_copy() for img in generated_images]
+        finally:
+            del self._inflight_generations[key]
+            inflight.set_result(None)
+
+    def _cached_images(self, key: str) -> Optional[List[GeneratedImage]]:
+        """Copies of the cached images for key, or None if expired or any file is gone."""
+        entry = self._image_cache.get(key)
+        if entry is None:
+            return None
+        expires_at, images = entry
+        if expires_at < time.monotonic() or not all(
+            img.url and (GENERATED_DIR / os.path.basename(img.url)).is_file() for img in images
+        ):
+            del self._image_cache[key]
+            return None
+        self._image_cache.move_to_end(key)
+        return [img.model_copy() for img in images]
+
+    async def _generate_for_ages(self, prompt: str, ages: List[int]) -> List[GeneratedImage]:
+        generated_images = []
         
         logger.info(f"Generating {len(ages)} images for ages: {ages}")
         logger.info(f"Starting GPT-5 image generation workflow")
@@ -79,13 +158,14 @@ class OpenAIService:
         
         logger.info("Calling GPT-5 responses API for base image...")
         start_time = time.time()
+        deadline = time.monotonic() + IMAGE_GENERATION_BUDGET
         
         try:
-            base_response = self.client.responses.create(
+            base_response = await asyncio.wait_for(self.client.responses.create(
                 model="gpt-5",
                 input=safe_base_prompt,
                 tools=[{"type": "image_generation"}],
-            )
+            ), timeout=IMAGE_GENERATION_BUDGET)
         except Exception as e:
             logger.error(f"GPT-5 base generation failed: {str(e)}")
             raise
@@ -110,92 +190,95 @@ class OpenAIService:
         logger.debug(f"Image data length: {len(base_image_data):,} characters")
         
         # Save base image
-        base_filename = f"base_age_{base_age}_{int(time.time())}.png"
+        base_filename = f"base_age_{base_age}_{int(time.time())}_{uuid.uuid4().hex[:8]}.png"
         base_path = await self._save_base64_image(base_image_data, base_filename)
         
         if not base_path:
             logger.error("Failed to save base image")
             raise ValueError("Failed to save base image to disk")
         
-        base_image = GeneratedImage(
+        # Fields are built here from trusted values, so skip re-validation
+        base_image = GeneratedImage.model_construct(
             url=base_path,
             caption=f"Age {base_age}",
             age=f"{base_age} Years Old",
             year=str(2025),  # Current year as baseline
-            call_id=base_response_id,
-            base64_data=base_image_data
+            call_id=base_response_id
         )
         generated_images.append(base_image)
         logger.info(f"Step 1 Complete: Base image saved for age {base_age}")
         
-        previous_response_id = base_response_id
+        # Every later age derives from the base response, so they can be generated concurrently
+        # Each follow-up, including its wait for the semaphore, must finish by the deadline
+        remaining = max(deadline - time.monotonic(), 0)
+        tasks = [
+            asyncio.create_task(asyncio.wait_for(self._gen_one(base_response_id, prompt, age, age - base_age), timeout=remaining))
+            for age in ages[1:]
+        ]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
         
-        # Generate subsequent images with professional context
-        for i in range(1, len(ages)):
-            current_age = ages[i]
-            age_difference = current_age - ages[i-1]
-            
-            # Create professional prompt for this age
-            safe_age_prompt = self._create_safe_prompt(prompt, current_age, is_base=False, age_difference=age_difference)
-            
-            logger.info(f"Step {i+1}: Generating image {i+1} of {len(ages)}")
-            logger.info(f"Previous Response ID: {previous_response_id}")
+        for age, result in zip(ages[1:], results):
+            if isinstance(result, asyncio.TimeoutError):
+                logger.error(f"Image generation for age {age} ran out of time after {IMAGE_GENERATION_BUDGET}s")
+            elif isinstance(result, Exception):
+                logger.error(f"Image generation failed for age {age}: {str(result)}")
+            elif result is not None:
+                generated_images.append(result)
+        
+        logger.info(f"Generated {len(generated_images)} images total")
+        return generated_images
+
+    async def _gen_one(self, base_response_id: str, prompt: str, age: int, age_difference: int) -> Optional[GeneratedImage]:
+        """Generate one aged image as a follow-up to the base response."""
+        # Create professional prompt for this age
+        safe_age_prompt = self._create_safe_prompt(prompt, age, is_base=False, age_difference=age_difference)
+        
+        async with self._generation_semaphore:
+            logger.info(f"Generating image for age {age} from base response {base_response_id}")
             logger.debug(f"Prompt: {safe_age_prompt}")
-            
-            logger.info("Calling GPT-5 with previous response...")
             start_time = time.time()
             
             try:
-                age_response = self.client.responses.create(
+                age_response = await self.client.responses.create(
                     model="gpt-5",
-                    previous_response_id=previous_response_id,
+                    previous_response_id=base_response_id,
                     input=safe_age_prompt,
                     tools=[{"type": "image_generation"}],
                 )
             except Exception as e:
-                logger.error(f"Safety system rejected generation for age {current_age}: {str(e)}")
-                # Skip this age and continue with next one
-                continue
-            
-            duration = time.time() - start_time
-            logger.info(f"Age generation took {duration:.1f} seconds")
-            logger.info(f"New Response ID: {age_response.id}")
-            
-            age_image_calls = [
-                output for output in age_response.output
-                if output.type == "image_generation_call"
-            ]
-            
-            if age_image_calls:
-                age_image_data = age_image_calls[0].result
-                age_filename = f"age_{current_age}_{int(time.time())}.png"
-                age_path = await self._save_base64_image(age_image_data, age_filename)
-                
-                if age_path:
-                    age_image = GeneratedImage(
-                        url=age_path,
-                        caption=f"Age {current_age}",
-                        age=f"{current_age} Years Old",
-                        year=str(2025 + (current_age - base_age)),  # Simulate time passage
-                        call_id=age_response.id,
-                        base64_data=age_image_data
-                    )
-                    generated_images.append(age_image)
-                    logger.info(f"Step {i+1} Complete: Image saved for age {current_age}")
-                    
-                    previous_response_id = age_response.id
-                else:
-                    logger.error(f"Failed to save image for age {current_age}")
-                    continue
-            else:
-                logger.error(f"No image data found for age {current_age}")
-                continue
-                
-            # Small delay between requests
-            await asyncio.sleep(0.5)  # Reduced delay to avoid rate limiting
+                logger.error(f"Safety system rejected generation for age {age}: {str(e)}")
+                # Skip this age; the other ages are unaffected
+                return None
         
-        logger.info(f"Generated {len(generated_images)} images total")
-        return generated_images
+        duration = time.time() - start_time
+        logger.info(f"Age {age} generation took {duration:.1f} seconds")
+        logger.info(f"New Response ID: {age_response.id}")
+        
+        age_image_calls = [
+            output for output in age_response.output
+            if output.type == "image_generation_call"
+        ]
+        
+        if not age_image_calls:
+            logger.error(f"No image data found for age {age}")
+            return None
+        
+        age_image_data = age_image_calls[0].result
+        age_filename = f"age_{age}_{int(time.time())}_{uuid.uuid4().hex[:8]}.png"
+        age_path = await self._save_base64_image(age_image_data, age_filename)
+        
+        if not age_path:
+            logger.error(f"Failed to save image for age {age}")
+            return None
+        
+        logger.info(f"Image saved for age {age}")
+        return GeneratedImage.model_construct(
+            url=age_path,
+            caption=f"Age {age}",
+            age=f"{age} Years Old",
+            year=str(2025 + age_difference),  # Simulate time passage
+            call_id=age_response.id
+        )
 
     async def regenerate_single_image(self, original_prompt: str, age: int, base_call_id: Optional[str] = None) -> Optional[GeneratedImage]:
         logger.info(f"Regenerating image for age {age}")
@@ -205,7 +288,7 @@ class OpenAIService:
         try:
             if base_call_id and age > 20:
                 # Use progression from base image
-                response = self.client.responses.create(
+                response = await self.client.responses.create(
                     model="gpt-5",
                     previous_response_id=base_call_id,
                     input=safe_age_prompt,
@@ -213,7 +296,7 @@ class OpenAIService:
                 )
             else:
                 # Generate new base image for this age
-                response = self.client.responses.create(
+                response = await self.client.responses.create(
                     model="gpt-5",
                     input=safe_age_prompt,
                     tools=[{"type": "image_generation"}]
@@ -229,18 +312,17 @@ class OpenAIService:
         
         if image_calls:
             image_data = image_calls[0].result
-            filename = f"regen_age_{age}_{int(time.time())}.png"
+            filename = f"regen_age_{age}_{int(time.time())}_{uuid.uuid4().hex[:8]}.png"
             local_image_path = await self._save_base64_image(image_data, filename)
             
             if local_image_path:
                 logger.info(f"Successfully regenerated image for age {age}")
-                return GeneratedImage(
+                return GeneratedImage.model_construct(
                     url=local_image_path,
                     caption=f"Age {age}",
                     age=f"{age} Years Old",
                     year=str(2025),  # Current year as baseline
-                    call_id=response.id,
-                    base64_data=image_data
+                    call_id=response.id
                 )
         
         logger.error(f"Failed to regenerate image for age {age}")
@@ -269,17 +351,16 @@ class OpenAIService:
 
     async def _save_base64_image(self, base64_data: str, filename: str) -> str:
         try:
-            from pathlib import Path
-            image_bytes = base64.b64decode(base64_data)
+            file_path = GENERATED_DIR / filename
 
-            # Use unified directory constants (same as main.py)
-            BASE_DIR = Path(__file__).resolve().parent.parent.parent   # backend/..
-            GENERATED_DIR = BASE_DIR / "generated"
-            GENERATED_DIR.mkdir(parents=True, exist_ok=True)
+            def _sync_save():
+                # Decode in chunks so the full image never sits in memory next to its base64 text
+                with open(file_path, 'wb') as f:
+                    for i in range(0, len(base64_data), B64_CHUNK_CHARS):
+                        f.write(base64.b64decode(base64_data[i:i + B64_CHUNK_CHARS]))
 
-            file_path = GENERATED_DIR / filename
-            with open(file_path, 'wb') as f:
-                f.write(image_bytes)
+            # CPU-bound decode and blocking disk I/O run off the event loop
+            await asyncio.get_running_loop().run_in_executor(self._io_executor, _sync_save)
 
             logger.info(f"Image saved successfully: {file_path}")
             # Return the full path for frontend access through static mount
@@ -1,13 +1,20 @@
-import subprocess
+import asyncio
+import hashlib
 import os
-import json
-import shutil
 import logging
+import shutil
+import tempfile
 import time
 import uuid
+from collections import deque
+from functools import lru_cache
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+import orjson
 from app.models import GeneratedImage
+from app.file_utils import fast_copy, link_or_copy, remove_stale_files
 import sys
 
 # Configure logging
@@ -19,6 +26,64 @@ BASE_DIR = Path(__file__).resolve().parent.parent.parent   # backend/..
 GENERATED_DIR = BASE_DIR / "generated"
 UPLOADS_DIR = BASE_DIR / "uploads"
 
+# npx resolved once; an absolute path also sidesteps PATH lookups at spawn time
+_NPX = shutil.which('npx.cmd' if sys.platform.startswith('win') else 'npx') or 'npx'
+
+# Prefix of staged image paths in props, relative to public/
+_PUBLIC_IMAGE_PREFIX = "images/"
+# Names OpenAIService gives generated images; only these are swept from public/images,
+# which also holds project assets such as the placeholder images
+_STAGED_IMAGE_PREFIXES = ("base_age_", "age_", "regen_age_")
+
+# Largest props JSON passed inline as --props=<json>; Windows caps the whole
+# command line at 32767 chars, Linux caps a single argument at 128 KiB
+_INLINE_PROPS_LIMIT = 30000 if sys.platform.startswith('win') else 120 * 1024
+
+# Props files that don't fit inline go to tmpfs when there is one (None = system temp dir)
+_PROPS_TMP_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+# Frame-capture concurrency for CLI renders: roughly half the cores, capped at 4.
+# REMOTION_CONCURRENCY overrides it (and the worker's per-render share) on bigger hosts.
+RENDER_CONCURRENCY = int(os.getenv("REMOTION_CONCURRENCY", "0")) or max(1, min((os.cpu_count() or 1) // 2, 4))
+# With a GPU, let Remotion pick its hardware GL backend instead of swangle
+USE_GPU = os.getenv("REMOTION_USE_GPU") == "1"
+
+# CLI renders allowed at once; each already spreads frame capture over RENDER_CONCURRENCY
+# cores. The worker bounds its own renders with its browser pool.
+MAX_CLI_RENDERS = int(os.getenv("REMOTION_MAX_RENDERS", "0")) or max(1, (os.cpu_count() or 1) // RENDER_CONCURRENCY)
+
+# Remotion CLI log level; REMOTION_VERBOSE_LOG=1 restores the old verbose output
+RENDER_LOG_LEVEL = "verbose" if os.getenv("REMOTION_VERBOSE_LOG") == "1" else "info"
+# How much of a failed render's stderr is kept for the error message
+STDERR_TAIL_LINES = 200
+STDERR_TAIL_BYTES = 4096
+
+# Cached `remotion bundle` output for CLI renders, rebuilt when the sources change
+BUNDLE_DIR = os.path.join("build", "render-bundle")
+BUNDLE_TIMEOUT = 180
+
+# Persistent Node render worker (bundles once, keeps browsers warm); see render-worker.mjs
+WORKER_SCRIPT = "render-worker.mjs"
+WORKER_START_TIMEOUT = 180  # Webpack bundle + browser launch on first start
+_WORKER_PREFIX = b"@@remotion-worker "
+
+# Reuse a finished video when the same images, audio, text and timings are rendered
+# again; REMOTION_RENDER_CACHE=0 always renders
+RENDER_CACHE = os.getenv("REMOTION_RENDER_CACHE", "1") != "0"
+_HASH_CHUNK = 1024 * 1024
+
+@lru_cache(maxsize=256)
+def _file_digest(path: str, mtime_ns: int, size: int) -> bytes:
+    """SHA-256 of a file's content, memoized on (path, mtime_ns, size)."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.digest()
+
+class _WorkerUnavailable(Exception):
+    """The render worker is not running; the caller should fall back to the CLI."""
+
 class RemotionService:
     def __init__(self):
         self.project_path = os.getenv("REMOTION_PROJECT_PATH", "../")
@@ -26,101 +91,198 @@ class RemotionService:
         self.generated_dir = GENERATED_DIR
         # Ensure directories exist
         self.generated_dir.mkdir(parents=True, exist_ok=True)
+        self._generated_dir_str = str(self.generated_dir)
+
+        # Staging and output directories, created once for the service lifetime
+        self._public_audio_dir = os.path.join(self.project_path, "public")
+        self._public_images_dir = os.path.join(self._public_audio_dir, _PUBLIC_IMAGE_PREFIX.rstrip("/"))
+        self._gen_dir = os.path.join(self.project_path, "generated")
+        for directory in (self._public_images_dir, self._gen_dir):
+            os.makedirs(directory, exist_ok=True)
+
+        # Render worker state; the worker itself is started lazily on the event loop
+        self._worker_enabled = os.getenv("REMOTION_WORKER", "1") != "0"
+        self._worker: Optional[asyncio.subprocess.Process] = None
+        self._worker_lock = asyncio.Lock()
+        self._worker_ready: Optional[asyncio.Future] = None
+        self._worker_reader: Optional[asyncio.Task] = None
+        self._worker_jobs: Dict[str, asyncio.Future] = {}
+        # _source_mtime() when the running worker was started, i.e. the sources it bundled
+        self._worker_src_mtime: Optional[float] = None
+
+        self._cli_render_semaphore = asyncio.Semaphore(MAX_CLI_RENDERS)
+        # Cache path -> future resolved when the render producing it finishes
+        self._inflight_renders: Dict[str, asyncio.Future] = {}
+
+        # Fixed parts of the render command; only the entry point, output and props vary
+        self._base_cmd = (_NPX, "remotion", "render")
+        self._tail_cmd = (
+            "--overwrite",
+            f"--log={RENDER_LOG_LEVEL}",
+            "--timeout=120000",  # 2 minutes total timeout (milliseconds)
+            "--delay-render-timeout=10000",  # 10 seconds for delayRender (milliseconds)
+            f"--concurrency={RENDER_CONCURRENCY}",
+            *(() if USE_GPU else ("--gl=swangle",)),  # Software GL; safe default for headless servers
+        )
+
+        # Cached CLI bundle; built on the first CLI render
+        self._serve_url: Optional[str] = None
+        self._bundle_mtime: Optional[float] = None
+        self._bundle_lock = asyncio.Lock()
 
         # Debug logging
-        logger.info(f"RemotionService initialized:")
-        logger.info(f"  BASE_DIR: {BASE_DIR}")
-        logger.info(f"  GENERATED_DIR: {GENERATED_DIR}")
-        logger.info(f"  UPLOADS_DIR: {UPLOADS_DIR}")
-        logger.info(f"  self.generated_dir: {self.generated_dir}")
-        logger.info(f"  project_path: {self.project_path}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("RemotionService initialized:")
+            logger.debug("  BASE_DIR: %s", BASE_DIR)
+            logger.debug("  GENERATED_DIR: %s", GENERATED_DIR)
+            logger.debug("  UPLOADS_DIR: %s", UPLOADS_DIR)
+            logger.debug("  self.generated_dir: %s", self.generated_dir)
+            logger.debug("  project_path: %s", self.project_path)
         
     def _extract_filename_from_url(self, url: str) -> str:
         """Extract filename from URL like http://localhost:8000/images/aged_40_1756232627.png"""
-        if url.startswith('http://') or url.startswith('https://'):
-            return url.split('/')[-1]
-        elif url.startswith('/images/'):
-            return url.replace('/images/', '')
-        else:
-            return url
+        return urlsplit(url).path.rsplit('/', 1)[-1] if url else url
             
+    def _copy_one(self, img: GeneratedImage, present: set) -> Optional[dict]:
+        """Copy a single generated image into public/images; returns its Remotion photo data or None"""
+        if not img.url:
+            return None
+
+        try:
+            # Extract filename from URL
+            filename = self._extract_filename_from_url(img.url)
+
+            if filename in present:
+                # Source path (in generated/ - using unified path)
+                source_path = os.path.join(self._generated_dir_str, filename)
+
+                # Destination path (in public/images/)
+                dest_path = os.path.join(self._public_images_dir, filename)
+
+                # Link image into public/images/ (falls back to copying)
+                try:
+                    link_or_copy(source_path, dest_path)
+                except FileNotFoundError:
+                    # public/images was removed since startup; recreate it and retry once
+                    os.makedirs(self._public_images_dir, exist_ok=True)
+                    link_or_copy(source_path, dest_path)
+                logger.info("Image staged: %s", filename)
+
+                # Create proper data structure for Remotion (matching aged-reel-data.ts)
+                return {
+                    "year": img.year or f"Age {img.age}",
+                    "age": img.age,
+                    "image": _PUBLIC_IMAGE_PREFIX + filename  # Relative path for Remotion
+                }
+            else:
+                logger.warning("Image not found: %s", os.path.join(self._generated_dir_str, filename))
+
+        except Exception as e:
+            logger.error("Error processing image %s: %s", img.url, e)
+
+        return None
+
+    def _render_cache_key(self, remotion_props: dict, audio_file: str) -> str:
+        """SHA-256 over everything that determines the rendered video."""
+        digest = hashlib.sha256()
+        # The staged audio name changes with every upload, so hash the audio content instead
+        props = {key: value for key, value in remotion_props.items() if key != "audioFile"}
+        digest.update(orjson.dumps(props, option=orjson.OPT_SORT_KEYS))
+        # Image files are identified by name plus size and mtime, which is enough for
+        # generator outputs that are written once
+        for photo in remotion_props["images"]:
+            st = os.stat(os.path.join(self._public_audio_dir, photo["image"]))
+            digest.update(f"{st.st_size}:{st.st_mtime_ns}".encode())
+        # Re-rendering with the same saved audio (retries, new image picks) skips the rehash
+        audio_st = os.stat(audio_file)
+        digest.update(_file_digest(audio_file, audio_st.st_mtime_ns, audio_st.st_size))
+        # A change to the composition invalidates everything rendered before it
+        digest.update(repr(self._source_mtime()).encode())
+        return digest.hexdigest()
+
     def _copy_images_to_public(self, images: List[GeneratedImage]) -> List[dict]:
         """Copy generated images to public/images directory and return proper data structure"""
-        copied_images = []
+        if not images:
+            return []
 
-        # Ensure public/images directory exists
-        public_images_dir = os.path.join(self.project_path, "public", "images")
-        os.makedirs(public_images_dir, exist_ok=True)
+        # One directory read instead of a stat per image
+        with os.scandir(self._generated_dir_str) as entries:
+            present = {entry.name for entry in entries}
 
-        for img in images:
-            if not img.url:
-                continue
+        # Copies are independent syscall-bound I/O that release the GIL, so run them concurrently
+        with ThreadPoolExecutor(max_workers=min(8, len(images))) as executor:
+            results = executor.map(lambda img: self._copy_one(img, present), images)
+            return [photo_data for photo_data in results if photo_data is not None]
 
-            try:
-                # Extract filename from URL
-                filename = self._extract_filename_from_url(img.url)
-
-                # Source path (in generated/ - using unified path)
-                source_path = self.generated_dir / filename
+    def remove_stale_staged_files(self, cutoff: float) -> int:
+        """Delete images and audio staged in public/ for renders, if older than cutoff."""
+        return (
+            remove_stale_files(self._public_images_dir, cutoff, prefix=_STAGED_IMAGE_PREFIXES)
+            + remove_stale_files(self._public_audio_dir, cutoff, prefix="custom_audio_")
+        )
 
-                # Destination path (in public/images/)
-                dest_path = os.path.join(public_images_dir, filename)
-
-                if source_path.exists():
-                    # Copy image to public/images/
-                    shutil.copy2(str(source_path), dest_path)
-                    logger.info(f"Image copied: {filename}")
-
-                    # Create proper data structure for Remotion (matching aged-reel-data.ts)
-                    photo_data = {
-                        "year": img.year or f"Age {img.age}",
-                        "age": img.age,
-                        "image": f"images/{filename}"  # Relative path for Remotion
-                    }
-                    copied_images.append(photo_data)
-                else:
-                    logger.warning(f"Image not found: {source_path}")
+    def _stage_audio(self, video_id: str, audio_file: str, audio_st: os.stat_result) -> str:
+        """Stage the audio in public/ for Remotion and return its file name there."""
+        # Name the staged copy after the source file's identity so re-renders with the
+        # same audio can reuse it
+        audio_ext = os.path.splitext(audio_file)[1]
+        audio_filename = f"custom_audio_{audio_st.st_ino:x}_{audio_st.st_size}_{audio_st.st_mtime_ns}{audio_ext}"
+        public_audio_path = os.path.join(self._public_audio_dir, audio_filename)
 
-            except Exception as e:
-                logger.error(f"Error processing image {img.url}: {e}")
-                continue
+        try:
+            dest_st = os.stat(public_audio_path)
+            already_staged = dest_st.st_size == audio_st.st_size and int(dest_st.st_mtime) == int(audio_st.st_mtime)
+        except FileNotFoundError:
+            already_staged = False
 
-        return copied_images
+        if already_staged:
+            logger.info("[%s] Custom audio already staged: %s", video_id, audio_filename)
+        else:
+            # Copy under a temporary name so a concurrent render never sees a partial file
+            tmp_audio_path = f"{public_audio_path}.{uuid.uuid4().hex[:8]}.tmp"
+            try:
+                fast_copy(audio_file, tmp_audio_path, size=audio_st.st_size)
+            except FileNotFoundError:
+                # public/ was removed since startup; recreate it and retry once
+                os.makedirs(self._public_audio_dir, exist_ok=True)
+                fast_copy(audio_file, tmp_audio_path, size=audio_st.st_size)
+            # Carry the source mtime over so the staged check above matches next time
+            os.utime(tmp_audio_path, ns=(audio_st.st_atime_ns, audio_st.st_mtime_ns))
+            os.replace(tmp_audio_path, public_audio_path)
+            logger.info("[%s] Copied custom audio: %s", video_id, audio_filename)
+        return audio_filename
 
     async def render_video(self, images: List[GeneratedImage], audio_file: str, title: str, name: str, duration_per_image: float = 2.0, transition_duration: float = 0.5, text_transition_duration: float = 1.0) -> str:
         """Complete pipeline: Copy images, setup audio, render video with Remotion with dynamic timing"""
         
         video_id = str(int(time.time()))
+        # Set while this call renders a cacheable video, so identical requests wait for it
+        inflight: Optional[asyncio.Future] = None
         
         try:
-            logger.info(f"[{video_id}] Starting dynamic video pipeline")
-            logger.info(f"[{video_id}] Title: '{title}', Name: '{name}', Images: {len(images)}")
-            logger.info(f"[{video_id}] Timing: {duration_per_image}s per image, {transition_duration}s transitions")
+            logger.info("[%s] Starting dynamic video pipeline", video_id)
+            logger.info("[%s] Title: '%s', Name: '%s', Images: %d", video_id, title, name, len(images))
+            logger.info("[%s] Timing: %ss per image, %ss transitions", video_id, duration_per_image, transition_duration)
             
+            loop = asyncio.get_running_loop()
             # Step 1: Copy images to public directory and get proper data structure
-            photos_data = self._copy_images_to_public(images)
+            photos_data = await loop.run_in_executor(None, self._copy_images_to_public, images)
             
             if len(photos_data) < 1:
                 raise Exception(f"No valid images found: {len(photos_data)}. Need at least 1.")
             
-            logger.info(f"[{video_id}] Copied {len(photos_data)} images to generated/")
+            logger.info("[%s] Copied %d images to generated/", video_id, len(photos_data))
             
-            # Step 2: Handle audio file
-            if not audio_file or not os.path.exists(audio_file):
+            # Step 2: Handle audio file (one stat for existence, size and mtime)
+            try:
+                audio_st = os.stat(audio_file) if audio_file else None
+            except OSError:
+                audio_st = None
+            if audio_st is None:
                 raise Exception("Audio file is required for video generation. Please provide a valid audio file.")
             
             try:
-                # Copy audio to public directory
-                public_audio_dir = os.path.join(self.project_path, "public")
-                os.makedirs(public_audio_dir, exist_ok=True)
-                
-                # Generate unique audio filename
-                audio_ext = os.path.splitext(audio_file)[1]
-                audio_filename = f"custom_audio_{video_id}{audio_ext}"
-                public_audio_path = os.path.join(public_audio_dir, audio_filename)
-                
-                shutil.copy2(audio_file, public_audio_path)
-                logger.info(f"[{video_id}] Copied custom audio: {audio_filename}")
+                audio_filename = await loop.run_in_executor(None, self._stage_audio, video_id, audio_file, audio_st)
             except Exception as e:
                 raise Exception(f"Failed to process audio file: {e}")
             
@@ -135,97 +297,382 @@ class RemotionService:
                 "textTransitionDuration": text_transition_duration  # Text fade-in duration
             }
             
-            logger.info(f"[{video_id}] Created dynamic props for {len(photos_data)} photos")
-            logger.info(f"[{video_id}] Video will be ~{len(photos_data) * duration_per_image + (len(photos_data)-1) * transition_duration:.1f} seconds long")
+            logger.info("[%s] Created dynamic props for %d photos", video_id, len(photos_data))
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("[%s] Video will be ~%.1f seconds long", video_id, len(photos_data) * duration_per_image + (len(photos_data)-1) * transition_duration)
             
-            # Step 4: Create props file with absolute path
-            props_filename = f"video_props_{uuid.uuid4().hex[:8]}.json"
-            props_file_path = os.path.abspath(os.path.join("generated", props_filename))
+            # Step 4: Generate output video path; with the cache on, it is named after the inputs
+            cached_path = None
+            if RENDER_CACHE:
+                try:
+                    cache_key = await loop.run_in_executor(None, self._render_cache_key, remotion_props, audio_file)
+                    cached_path = os.path.join(self._gen_dir, f"aging_video_{cache_key[:32]}.mp4")
+                except OSError as e:
+                    logger.warning("[%s] Could not compute render cache key, rendering uncached: %s", video_id, e)
+            if cached_path:
+                while True:
+                    try:
+                        # Restart its retention period; the cleanup loop goes by mtime
+                        os.utime(cached_path)
+                        logger.info("[%s] Reusing cached render: %s", video_id, cached_path)
+                        return cached_path
+                    except FileNotFoundError:
+                        pass
+                    pending = self._inflight_renders.get(cached_path)
+                    if pending is None:
+                        break
+                    # Identical render already running; wait, then take its output from the
+                    # cache (or render ourselves if it failed). Shielded so our cancellation
+                    # doesn't cancel the other request's future.
+                    logger.info("[%s] Identical render in progress, waiting for it", video_id)
+                    await asyncio.shield(pending)
+                inflight = asyncio.get_running_loop().create_future()
+                self._inflight_renders[cached_path] = inflight
+            # Render under a unique name; a cached video is only ever a finished one
+            output_filename = f"aging_video_{uuid.uuid4().hex[:8]}.mp4"
+            output_path = os.path.join(self._gen_dir, output_filename)
             
-            # Ensure generated directory exists
-            os.makedirs("generated", exist_ok=True)
+            # Dynamic timeout based on number of images (more images = longer render time)
+            base_timeout = 120  # 2 minutes base
+            per_image_timeout = 30  # 30 seconds per image
+            max_timeout = 300  # 5 minutes maximum
             
-            # Write props file with pretty formatting
-            with open(props_file_path, 'w', encoding='utf-8') as f:
-                json.dump(remotion_props, f, indent=2, ensure_ascii=False)
+            estimated_timeout = min(base_timeout + (len(photos_data) * per_image_timeout), max_timeout)
             
-            logger.info(f"[{video_id}] Created props file: {props_file_path}")
+            logger.info("[%s] Using timeout: %ss for %d images", video_id, estimated_timeout, len(photos_data))
             
-            # Step 5: Generate output video path
-            output_filename = f"aging_video_{uuid.uuid4().hex[:8]}.mp4"
-            output_path = os.path.abspath(os.path.join(self.project_path, "generated", output_filename))
+            # Step 5: Render on the warm worker when it is available
+            if await self._ensure_worker():
+                try:
+                    await self._render_with_worker(video_id, remotion_props, output_path, estimated_timeout)
+                    logger.info("[%s] Video rendered successfully!", video_id)
+                    return self._publish_render(video_id, output_path, cached_path)
+                except _WorkerUnavailable as e:
+                    logger.warning("[%s] Render worker unavailable (%s), falling back to Remotion CLI", video_id, e)
+            
+            # Step 6: Pass props inline; only very large payloads go through a file
+            # orjson emits compact UTF-8 directly, so the size check needs no re-encode
+            props_json = orjson.dumps(remotion_props)
+            props_file_path = None
+            if len(props_json) <= _INLINE_PROPS_LIMIT:
+                props_arg = props_json.decode("utf-8")
+            else:
+                # Written to RAM-backed storage where available; it only lives for this render
+                with tempfile.NamedTemporaryFile(mode='wb', prefix="video_props_", suffix=".json", delete=False, dir=_PROPS_TMP_DIR) as f:
+                    f.write(props_json)
+                props_file_path = f.name
+                props_arg = props_file_path
+                logger.info("[%s] Props too large for the command line, created props file: %s", video_id, props_file_path)
             
-            # Step 6: Build Remotion render command with timeout configurations
+            # Step 7: Build Remotion render command with timeout configurations
+            serve_url = await self._get_serve_url()
             cmd = [
-                "npx", "remotion", "render",
-                "src/index.ts",  # Entry point
+                *self._base_cmd,
+                serve_url or "src/index.ts",  # Cached bundle, or the entry point if bundling failed
                 "DynamicAgedReel",      # Component name
                 output_path,     # Output file
-                f"--props={props_file_path}",  # Props file path
-                "--overwrite",
-                "--log=verbose",
-                "--timeout=120000",  # 2 minutes total timeout (milliseconds)
-                "--delay-render-timeout=10000",  # 10 seconds for delayRender (milliseconds)
-                "--concurrency=1",  # Single thread to avoid issues
-                "--gl=swangle",  # Use software rendering instead of EGL
+                f"--props={props_arg}",  # Inline JSON or props file path (no shell, so no quoting needed)
+                *self._tail_cmd,
             ]
             
-            # Use .cmd on Windows
-            if sys.platform.startswith('win'):
-                cmd[0] = "npx.cmd"
-            
-            logger.info(f"[{video_id}] Executing Remotion render...")
-            logger.info(f"[{video_id}] Command: {' '.join(cmd)}")
-            logger.info(f"[{video_id}] Working directory: {self.project_path}")
+            logger.info("[%s] Executing Remotion render...", video_id)
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("[%s] Command: %s", video_id, ' '.join(cmd))
+            logger.info("[%s] Working directory: %s", video_id, self.project_path)
             
-            # Step 7: Execute Remotion render with extended timeout
-            # Dynamic timeout based on number of images (more images = longer render time)
-            base_timeout = 120  # 2 minutes base
-            per_image_timeout = 30  # 30 seconds per image
-            max_timeout = 300  # 5 minutes maximum
-            
-            estimated_timeout = min(base_timeout + (len(photos_data) * per_image_timeout), max_timeout)
-            
-            logger.info(f"[{video_id}] Using timeout: {estimated_timeout}s for {len(photos_data)} images")
-            
-            process = subprocess.run(
-                cmd,
-                cwd=self.project_path,
-                capture_output=True,
-                text=True,
-                shell=False,
-                timeout=estimated_timeout
-            )
+            # Step 8: Execute Remotion render with extended timeout
+            try:
+                # Each CLI render starts its own Chrome; cap how many share the machine
+                async with self._cli_render_semaphore:
+                    # Only stderr is kept, and only its tail, so long renders can't pile up logs in memory
+                    process = await asyncio.create_subprocess_exec(
+                        *cmd,
+                        cwd=self.project_path,
+                        stdout=asyncio.subprocess.DEVNULL,
+                        stderr=asyncio.subprocess.PIPE,
+                        limit=1024 * 1024
+                    )
+                    stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
+
+                    async def _drain_stderr():
+                        async for line in process.stderr:
+                            stderr_tail.append(line)
+                        await process.wait()
+
+                    try:
+                        await asyncio.wait_for(_drain_stderr(), timeout=estimated_timeout)
+                    except (asyncio.TimeoutError, asyncio.CancelledError):
+                        # Also on cancellation, so a render never outlives its semaphore slot
+                        process.kill()
+                        await process.wait()
+                        raise
+            finally:
+                if props_file_path:
+                    try:
+                        os.remove(props_file_path)
+                    except OSError:
+                        pass
+            stderr = b''.join(stderr_tail)[-STDERR_TAIL_BYTES:].decode('utf-8', errors='replace')
             
-            # Step 8: Handle render results
+            # Step 9: Handle render results
             if process.returncode == 0:
-                logger.info(f"[{video_id}] Video rendered successfully!")
-                logger.info(f"[{video_id}] Output: {output_path}")
-                
-                # Clean up props file
-                try:
-                    os.remove(props_file_path)
-                except:
-                    pass
-                
-                return output_path
+                logger.info("[%s] Video rendered successfully!", video_id)
+                return self._publish_render(video_id, output_path, cached_path)
             else:
                 # Log detailed error information
-                logger.error(f"[{video_id}] Remotion render failed with return code {process.returncode}")
-                logger.error(f"[{video_id}] STDOUT: {process.stdout}")
-                logger.error(f"[{video_id}] STDERR: {process.stderr}")
+                logger.error("[%s] Remotion render failed with return code %s", video_id, process.returncode)
+                logger.error("[%s] STDERR: %s", video_id, stderr)
+                raise Exception(f"Remotion render failed: {stderr}")
                 
-                # Clean up on failure
-                try:
-                    os.remove(props_file_path)
-                except:
-                    pass
-                
-                raise Exception(f"Remotion render failed: {process.stderr}")
-                
-        except subprocess.TimeoutExpired:
-            logger.error(f"[{video_id}] Render timeout after {estimated_timeout} seconds")
+        except asyncio.TimeoutError:
+            logger.error("[%s] Render timeout after %s seconds", video_id, estimated_timeout)
             raise Exception(f"Video rendering timed out after {estimated_timeout} seconds. This may be due to complex images or system performance. Try using fewer images or simpler content.")
         except Exception as e:
-            logger.error(f"[{video_id}] Error in video pipeline: {str(e)}")
+            logger.error("[%s] Error in video pipeline: %s", video_id, e)
             raise e
+        finally:
+            if inflight is not None:
+                del self._inflight_renders[cached_path]
+                inflight.set_result(None)
+
+    def _publish_render(self, video_id: str, output_path: str, cached_path: Optional[str]) -> str:
+        """Move a finished render to its cache name, if it has one, and return the final path."""
+        if cached_path:
+            os.replace(output_path, cached_path)
+            output_path = cached_path
+        logger.info("[%s] Output: %s", video_id, output_path)
+        return output_path
+
+    def _source_mtime(self) -> float:
+        """Newest mtime across the Remotion sources and config."""
+        newest = os.stat(os.path.join(self.project_path, "remotion.config.ts")).st_mtime
+        for root, _, files in os.walk(os.path.join(self.project_path, "src")):
+            for name in files:
+                newest = max(newest, os.stat(os.path.join(root, name)).st_mtime)
+        return newest
+
+    async def _get_serve_url(self) -> Optional[str]:
+        """Return the cached bundle directory, rebuilding it if the sources changed.
+
+        Returns None if bundling fails, in which case the CLI bundles from src/index.ts itself.
+        """
+        try:
+            src_mtime = self._source_mtime()
+        except OSError as e:
+            logger.warning("Could not stat Remotion sources, skipping bundle cache: %s", e)
+            return None
+        if self._serve_url is not None and self._bundle_mtime == src_mtime:
+            return self._serve_url
+
+        async with self._bundle_lock:
+            if self._serve_url is not None and self._bundle_mtime == src_mtime:
+                return self._serve_url
+
+            bundle_dir = os.path.join(self.project_path, BUNDLE_DIR)
+            cmd = [_NPX, "remotion", "bundle", "src/index.ts", f"--out-dir={bundle_dir}"]
+
+            logger.info("Bundling Remotion project into %s", bundle_dir)
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                cwd=self.project_path,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE
+            )
+            try:
+                _, stderr = await asyncio.wait_for(process.communicate(), timeout=BUNDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                logger.warning("Remotion bundle timed out after %s seconds", BUNDLE_TIMEOUT)
+                return None
+            if process.returncode != 0:
+                logger.warning("Remotion bundle failed: %s", stderr.decode('utf-8', errors='replace'))
+                return None
+
+            # The bundle holds a snapshot of public/, but images and audio are staged
+            # there per request; point it at the live directory instead
+            bundled_public = os.path.join(bundle_dir, "public")
+            try:
+                if os.path.islink(bundled_public):
+                    os.unlink(bundled_public)
+                else:
+                    shutil.rmtree(bundled_public, ignore_errors=True)
+                os.symlink(os.path.join(self.project_path, "public"), bundled_public, target_is_directory=True)
+            except OSError as e:
+                logger.warning("Could not link public/ into the bundle, not caching it: %s", e)
+                return None
+
+            self._serve_url = bundle_dir
+            self._bundle_mtime = src_mtime
+            logger.info("Remotion bundle ready: %s", bundle_dir)
+            return bundle_dir
+
+    async def start_worker(self) -> None:
+        """Start the persistent render worker ahead of the first request."""
+        await self._ensure_worker()
+
+    async def stop_worker(self) -> None:
+        """Shut down the render worker; closing its stdin makes it exit cleanly."""
+        worker = self._worker
+        if worker is None or worker.returncode is not None:
+            return
+        worker.stdin.close()
+        try:
+            await asyncio.wait_for(worker.wait(), timeout=10)
+        except asyncio.TimeoutError:
+            worker.kill()
+            await worker.wait()
+        # Let the reader fail this worker's jobs before a new worker reuses the shared state
+        if self._worker_reader is not None:
+            await self._worker_reader
+
+    def _worker_outdated(self) -> bool:
+        """True if the Remotion sources changed since the running worker bundled them."""
+        try:
+            return self._source_mtime() != self._worker_src_mtime
+        except OSError:
+            return False
+
+    async def _ensure_worker(self) -> bool:
+        """Return True if the render worker is running, starting it if needed.
+
+        A worker whose bundle predates the current sources is restarted once it is idle;
+        until then renders go to the CLI, which bundles the current sources.
+        """
+        if self._worker is not None and self._worker.returncode is None and not self._worker_outdated():
+            return True
+        if not self._worker_enabled:
+            return False
+
+        async with self._worker_lock:
+            if self._worker is not None and self._worker.returncode is None:
+                if not self._worker_outdated():
+                    return True
+                if self._worker_jobs:
+                    return False
+                logger.info("Remotion sources changed, restarting render worker")
+                await self.stop_worker()
+
+            node = shutil.which("node")
+            script = os.path.join(self.project_path, WORKER_SCRIPT)
+            if node is None or not os.path.exists(script):
+                logger.warning("Render worker disabled: node or render-worker.mjs not found")
+                self._worker_enabled = False
+                return False
+
+            logger.info("Starting Remotion render worker: %s", script)
+            try:
+                src_mtime = self._source_mtime()
+            except OSError:
+                src_mtime = None
+            loop = asyncio.get_running_loop()
+            self._worker_ready = loop.create_future()
+            try:
+                self._worker = await asyncio.create_subprocess_exec(
+                    node, script,
+                    cwd=self.project_path,
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.PIPE,
+                    limit=1024 * 1024  # Remotion progress lines can be long
+                )
+                self._worker_reader = asyncio.create_task(self._read_worker(self._worker))
+                info = await asyncio.wait_for(asyncio.shield(self._worker_ready), timeout=WORKER_START_TIMEOUT)
+            except asyncio.CancelledError:
+                # Shut down while starting; don't leave the worker running
+                if self._worker is not None and self._worker.returncode is None:
+                    self._worker.kill()
+                    await self._worker.wait()
+                self._worker = None
+                raise
+            except Exception as e:
+                # Bundling or browser launch failed; don't retry on every request
+                logger.error("Render worker failed to start, using Remotion CLI instead: %s", e)
+                self._worker_enabled = False
+                if self._worker is not None and self._worker.returncode is None:
+                    self._worker.kill()
+                    await self._worker.wait()
+                self._worker = None
+                return False
+
+            self._worker_src_mtime = src_mtime
+            logger.info("Render worker ready: %s", info)
+            return True
+
+    async def _read_worker(self, worker: asyncio.subprocess.Process) -> None:
+        """Dispatch worker replies to waiting renders; fail them all if the worker exits."""
+        try:
+            while True:
+                line = await worker.stdout.readline()
+                if not line:
+                    break
+                if not line.startswith(_WORKER_PREFIX):
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("[render-worker] %s", line.decode('utf-8', errors='replace').rstrip())
+                    continue
+                try:
+                    msg = orjson.loads(line[len(_WORKER_PREFIX):])
+                except ValueError:
+                    logger.warning("[render-worker] Malformed reply: %r", line)
+                    continue
+                if msg.get("ready"):
+                    if not self._worker_ready.done():
+                        self._worker_ready.set_result(msg)
+                    continue
+                future = self._worker_jobs.pop(msg.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(msg)
+        except Exception as e:
+            # e.g. a line over the stream limit; replies can no longer be matched up
+            logger.error("Could not read render worker output, stopping it: %s", e)
+        finally:
+            # Don't wait on a worker that is still running: fail its jobs now so they
+            # fall back to the CLI, and the next render starts a fresh worker
+            if worker.returncode is None:
+                try:
+                    worker.kill()
+                except ProcessLookupError:
+                    pass
+            await worker.wait()
+            error = _WorkerUnavailable(f"worker exited with code {worker.returncode}")
+            if not self._worker_ready.done():
+                self._worker_ready.set_exception(error)
+            for future in self._worker_jobs.values():
+                if not future.done():
+                    future.set_exception(error)
+            self._worker_jobs.clear()
+
+    def _abandon_worker_job(self, job_id: str) -> None:
+        """Forget a job nobody is waiting for and stop its render so it frees its browser."""
+        self._worker_jobs.pop(job_id, None)
+        try:
+            self._worker.stdin.write(orjson.dumps({"cancel": job_id}) + b"\n")
+        except Exception:
+            pass
+
+    async def _render_with_worker(self, video_id: str, props: dict, output_path: str, timeout: float) -> None:
+        """Render one video on the worker; raises _WorkerUnavailable if it died."""
+        job_id = uuid.uuid4().hex
+        future = asyncio.get_running_loop().create_future()
+        self._worker_jobs[job_id] = future
+
+        logger.info("[%s] Sending render job %s to worker", video_id, job_id)
+        try:
+            self._worker.stdin.write(orjson.dumps({"id": job_id, "props": props, "output": output_path}) + b"\n")
+            await self._worker.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError) as e:
+            self._worker_jobs.pop(job_id, None)
+            raise _WorkerUnavailable(str(e))
+        except asyncio.CancelledError:
+            self._abandon_worker_job(job_id)
+            raise
+
+        try:
+            result = await asyncio.wait_for(future, timeout=timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            # Timed out here, or cancelled by the step timeout, job cancellation or shutdown
+            self._abandon_worker_job(job_id)
+            raise
+
+        if not result.get("ok"):
+            logger.error("[%s] Remotion worker render failed: %s", video_id, result.get('error'))
+            raise Exception(f"Remotion render failed: {result.get('error')}")
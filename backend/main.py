@@ -1,25 +1,38 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request, Depends
+from fastapi.responses import FileResponse, ORJSONResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
+from starlette.concurrency import run_in_threadpool
 import asyncio
+import atexit
 import os
+import queue
 import shutil
 import time
-import uuid
+import secrets
 import logging
+from logging.handlers import QueueHandler, QueueListener
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Union
 from pathlib import Path
-import json
+import posixpath
 import re
+try:
+    from asyncio import timeout as async_timeout  # Python 3.11+
+except ImportError:
+    from async_timeout import timeout as async_timeout
 from dotenv import load_dotenv
+import orjson
+from pydantic import ValidationError
 
-from app.models import VideoGenerationRequest, VideoGenerationResponse, GeneratedImage, DynamicVideoRequest
-from app.openai_service import OpenAIService
+from app.models import VideoGenerationRequest, VideoGenerationResponse, GeneratedImage, DynamicVideoRequest, AgesIn, GENERATED_IMAGE_LIST_ADAPTER
+from app.openai_service import OpenAIService, IMAGE_GENERATION_BUDGET
 from app.remotion_service import RemotionService
 from app.audio_processor import AudioProcessor
+from app.job_queue import JobQueue, report_progress
+from app.file_utils import remove_stale_files
 
 # Load environment variables
 load_dotenv()
@@ -28,16 +41,25 @@ load_dotenv()
 logs_dir = os.path.join(os.path.dirname(__file__), 'logs')
 os.makedirs(logs_dir, exist_ok=True)
 
-# Configure logging with UTF-8 encoding support
+# Configure logging with UTF-8 encoding support. Request handlers only enqueue
+# records; a listener thread does the file and console writes off the event loop.
 log_file_path = os.path.join(logs_dir, 'tiktok_aging_app.log')
+_log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+_log_handlers = [
+    logging.FileHandler(log_file_path, encoding='utf-8'),
+    logging.StreamHandler()
+]
+for _handler in _log_handlers:
+    _handler.setFormatter(_log_formatter)
+_log_queue = queue.SimpleQueue()
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(log_file_path, encoding='utf-8'),
-        logging.StreamHandler()
-    ]
+    handlers=[QueueHandler(_log_queue)]
 )
+_log_listener = QueueListener(_log_queue, *_log_handlers, respect_handler_level=True)
+_log_listener.start()
+# Flush whatever is still queued at interpreter exit
+atexit.register(_log_listener.stop)
 
 # Create logger
 logger = logging.getLogger(__name__)
@@ -50,46 +72,115 @@ GENERATED_DIR = BASE_DIR / "generated"
 UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
 GENERATED_DIR.mkdir(parents=True, exist_ok=True)
 
+# Uploads are copied to disk in chunks of this size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Uploaded audio and generated images/videos older than this are deleted periodically
+FILE_RETENTION_SECONDS = float(os.getenv("FILE_RETENTION_HOURS", "6")) * 3600
+CLEANUP_INTERVAL_SECONDS = 1800
+
+# Largest request body accepted: a 50MB audio file (AudioProcessor's limit) plus the form fields
+MAX_REQUEST_BODY_BYTES = int(os.getenv("MAX_REQUEST_BODY_MB", "60")) * 1024 * 1024
+
 app = FastAPI(
     title="TikTok Aging App API", 
     version="1.0.0",
-    description="Long-running video generation API with proper timeout handling"
+    description="Long-running video generation API with proper timeout handling",
+    # orjson serializes the image lists and configs in the pipeline responses much faster
+    default_response_class=ORJSONResponse
 )
 
+# Timeouts for the steps that can hang. They name the step in the 504 and, unlike
+# the request timeouts below, also apply to background jobs.
+# Margin over the service's own deadline for saving the last images
+IMAGE_GENERATION_TIMEOUT = IMAGE_GENERATION_BUDGET + 50
+RENDER_TIMEOUT = 850
+
+# Per-endpoint request timeouts in seconds; everything else gets _DEFAULT_TIMEOUT.
+# These are last-resort ceilings above the step timeouts.
+_TIMEOUTS = {
+    # 15 minutes for video rendering
+    "/render-aging-video": 900,
+    "/generate-video": 900,
+    # Image generation followed by a render
+    "/dynamic-aging-video": 2000,
+    "/complete-aging-pipeline": 2000,
+    "/generate-and-render-video": 2000,
+    # 20 minutes for image generation (GPT-5 can be slow)
+    "/test-generate-images": 1200,
+    "/gpt5-iterative-aging": 1200,
+    "/regenerate-image": 1200,
+}
+_DEFAULT_TIMEOUT = 60  # 1 minute for other operations
+
 # Timeout middleware for long-running operations
 @app.middleware("http")
 async def timeout_middleware(request: Request, call_next):
     """Handle timeouts for long-running video generation operations."""
     
     # Set different timeouts based on endpoint
-    if "render" in request.url.path or "dynamic" in request.url.path:
-        timeout = 900  # 15 minutes for video rendering
-    elif "images" in request.url.path:
-        timeout = 1200  # 20 minutes for image generation (GPT-5 can be slow)
-    else:
-        timeout = 60   # 1 minute for other operations
+    path = request.scope["path"]
+    timeout = _TIMEOUTS.get(path, _DEFAULT_TIMEOUT)
     
     try:
         start_time = time.time()
-        response = await asyncio.wait_for(call_next(request), timeout=timeout)
+        # A deadline on the current task; unlike wait_for, no extra Task per request
+        async with async_timeout(timeout):
+            response = await call_next(request)
         process_time = time.time() - start_time
         
         if process_time > 60:  # Log long operations
-            logger.info(f"Long operation completed: {request.url.path} took {process_time:.2f}s")
+            logger.info(f"Long operation completed: {path} took {process_time:.2f}s")
         
         response.headers["X-Process-Time"] = str(process_time)
         return response
         
     except asyncio.TimeoutError:
-        logger.error(f"Request timeout after {timeout}s for {request.url.path}")
+        logger.error(f"Request timeout after {timeout}s for {path}")
         raise HTTPException(
             status_code=504, 
             detail=f"Request timed out after {timeout} seconds. Video generation is still processing in background."
         )
     except Exception as e:
-        logger.error(f"Middleware error for {request.url.path}: {str(e)}")
+        logger.error(f"Middleware error for {path}: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+class BodySizeLimitMiddleware:
+    """Reject request bodies over max_bytes before the multipart parser spools them to disk."""
+
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Honest clients declare the size up front, so refuse before reading anything
+        for header, value in scope["headers"]:
+            if header == b"content-length" and value.isdigit() and int(value) > self.max_bytes:
+                response = ORJSONResponse({"detail": "Request body too large"}, status_code=413)
+                await response(scope, receive, send)
+                return
+
+        # Chunked or mislabelled bodies are counted as they arrive
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(status_code=413, detail="Request body too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+# Added first so CORS, added later and so outermost, still decorates its 413s
+app.add_middleware(BodySizeLimitMiddleware, max_bytes=MAX_REQUEST_BODY_BYTES)
+
 # Trust localhost and development hosts
 app.add_middleware(
     TrustedHostMiddleware, 
@@ -105,15 +196,101 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Mount static files for generated videos and images
-app.mount("/generated", StaticFiles(directory=GENERATED_DIR), name="generated")
-app.mount("/images", StaticFiles(directory=GENERATED_DIR), name="images")
+class ImmutableStaticFiles(StaticFiles):
+    """StaticFiles for outputs that never change once written, so browsers need not revalidate.
+
+    Only safe because every file written to GENERATED_DIR has a unique name: images carry a
+    random suffix, and videos a random or content-derived one.
+    """
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+# Mount static files for generated videos and images. /images is an alias of
+# /generated kept for existing URLs, so both share one StaticFiles app.
+generated_files = ImmutableStaticFiles(directory=GENERATED_DIR)
+app.mount("/generated", generated_files, name="generated")
+app.mount("/images", generated_files, name="images")
 app.mount("/uploads", StaticFiles(directory=UPLOADS_DIR), name="uploads")
 
 # Initialize services
 openai_service = OpenAIService()
 remotion_service = RemotionService()
 audio_processor = AudioProcessor()
+job_queue = JobQueue()
+
+@app.on_event("startup")
+async def check_single_process():
+    # Jobs (/jobs polling and SSE), the render and image single-flight maps and the render
+    # worker's browser pool all live in this process, so they break across several
+    # workers. uvicorn's CLI also reads WEB_CONCURRENCY for its --workers default.
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if workers > 1:
+        raise RuntimeError(
+            f"WEB_CONCURRENCY={workers} is not supported: background jobs, render "
+            "coalescing and the render worker keep per-process state. Run one worker."
+        )
+
+@app.on_event("startup")
+async def start_job_queue():
+    job_queue.start()
+
+def _remove_stale_files() -> int:
+    """Delete files older than FILE_RETENTION_SECONDS in UPLOADS_DIR, GENERATED_DIR and
+    the Remotion staging dirs, which hold hardlinks to (or copies of) the same files."""
+    cutoff = time.time() - FILE_RETENTION_SECONDS
+    removed = remove_stale_files(UPLOADS_DIR, cutoff) + remove_stale_files(GENERATED_DIR, cutoff)
+    return removed + remotion_service.remove_stale_staged_files(cutoff)
+
+async def _cleanup_loop():
+    while True:
+        try:
+            removed = await run_in_threadpool(_remove_stale_files)
+            if removed:
+                logger.info(f"Cleanup removed {removed} stale files")
+        except Exception as e:
+            logger.error(f"File cleanup failed: {str(e)}")
+        await asyncio.sleep(CLEANUP_INTERVAL_SECONDS)
+
+@app.on_event("startup")
+async def start_cleanup_loop():
+    app.state.cleanup_task = asyncio.create_task(_cleanup_loop())
+
+@app.on_event("shutdown")
+async def stop_cleanup_loop():
+    app.state.cleanup_task.cancel()
+
+@app.on_event("startup")
+async def start_render_worker():
+    # Bundle and launch browsers now so the first render doesn't pay for it, in the
+    # background: that takes up to a few minutes and the app must serve meanwhile
+    app.state.render_worker_start = asyncio.create_task(remotion_service.start_worker())
+
+@app.on_event("shutdown")
+async def stop_job_queue():
+    await job_queue.stop()
+
+@app.on_event("shutdown")
+async def stop_render_worker():
+    app.state.render_worker_start.cancel()
+    await asyncio.gather(app.state.render_worker_start, return_exceptions=True)
+    await remotion_service.stop_worker()
+
+@app.on_event("shutdown")
+def stop_audio_executor():
+    audio_processor.shutdown()
+
+# Upload content types accepted as audio; browsers send video/* for some audio
+# containers (webm, mp4) and octet-stream when they don't know the type
+_AUDIO_CONTENT_TYPES = ("audio/", "video/", "application/octet-stream")
+
+def _save_upload(src, dst_path, first: bytes) -> None:
+    """Write the already-peeked first bytes, then the rest of the upload, to dst_path."""
+    with open(dst_path, "wb") as out:
+        out.write(first)
+        shutil.copyfileobj(src, out, UPLOAD_CHUNK_SIZE)
 
 async def process_audio_upload(
     audio_file: UploadFile,
@@ -141,88 +318,193 @@ async def process_audio_upload(
             )
         return None
 
-    # Read content to check if file is empty
-    content = await audio_file.read()
-    if not content:
+    # Reject oversized or clearly non-audio uploads before copying them anywhere
+    max_size = audio_processor.max_file_size
+    if audio_file.size is not None and audio_file.size > max_size:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Audio file too large ({audio_file.size} bytes, max {max_size // (1024 * 1024)}MB)"
+        )
+    content_type = audio_file.content_type or ""
+    if content_type and not content_type.startswith(_AUDIO_CONTENT_TYPES):
+        raise HTTPException(status_code=400, detail=f"Unsupported audio content type: {content_type}")
+
+    # Peek one byte to reject empty uploads before touching the disk
+    first = await audio_file.read(1)
+    if not first:
         if require_audio:
             raise HTTPException(status_code=400, detail="Audio file is empty")
         return None
 
     timestamp = int(time.time())
     original_filename = f"{file_prefix}_{timestamp}_{audio_file.filename}"
+    audio_path_str = str(UPLOADS_DIR / original_filename)
+    # Write under a hidden name that keeps the extension (validation reads it), and
+    # publish only the file we keep, so /uploads never shows a partial or discarded copy
+    temp_audio_path_str = str(UPLOADS_DIR / f".part_{original_filename}")
 
-    # Use consistent uploads directory
-    temp_audio_path = UPLOADS_DIR / original_filename
-
+    final_audio_path = None
     try:
-        # Save uploaded file
+        # Copy the spooled upload to disk in one native loop off the event loop
         logger.info(f"Saving audio file: {original_filename}")
-        with open(temp_audio_path, "wb") as buffer:
-            buffer.write(content)
-
-        temp_audio_path_str = str(temp_audio_path)
+        await run_in_threadpool(_save_upload, audio_file.file, temp_audio_path_str, first)
         logger.info(f"Audio file saved to: {temp_audio_path_str}")
 
         # Skip validation and conversion if not required
         if not validate_and_convert:
-            logger.info(f"Audio processing completed (no validation): {temp_audio_path_str}")
-            return temp_audio_path_str
+            os.replace(temp_audio_path_str, audio_path_str)
+            logger.info(f"Audio processing completed (no validation): {audio_path_str}")
+            return audio_path_str
 
-        # Validate audio file
-        validation = audio_processor.validate_audio(temp_audio_path_str)
+        # Validate audio file (blocking ffprobe call, so keep it off the event loop)
+        validation = await audio_processor.run_blocking(audio_processor.validate_audio, temp_audio_path_str)
         logger.info(f"Audio validation result: {validation}")
 
         if not validation['valid']:
-            # Clean up invalid file
-            if os.path.exists(temp_audio_path_str):
-                os.remove(temp_audio_path_str)
             raise HTTPException(status_code=400, detail=f"Invalid audio file: {validation['error']}")
 
-        # Convert to MP3 if needed
-        final_audio_path = temp_audio_path_str
+        # Convert to the configured target codec (AUDIO_TARGET_CODEC) if needed
         if validation.get('needs_conversion', False):
-            logger.info(f"Converting audio to MP3...")
-            converted_filename = f"converted_{file_prefix}_{timestamp}.mp3"
-            converted_path = audio_processor.convert_to_mp3(temp_audio_path_str, converted_filename)
-
-            if converted_path:
-                final_audio_path = converted_path
-                # Clean up original file
-                if os.path.exists(temp_audio_path_str):
-                    os.remove(temp_audio_path_str)
+            logger.info(f"Converting audio with {audio_processor.target_codec}...")
+            converted_filename = f"converted_{file_prefix}_{timestamp}{audio_processor.target_ext}"
+            final_audio_path = await audio_processor.convert_audio(
+                temp_audio_path_str,
+                converted_filename,
+                input_format=validation.get('detected_format') or validation.get('format')
+            )
+            if final_audio_path:
+                os.remove(temp_audio_path_str)
                 logger.info(f"Audio converted successfully to: {final_audio_path}")
             else:
                 logger.warning(f"Audio conversion failed, using original file")
 
+        if not final_audio_path:
+            final_audio_path = audio_path_str
+            os.replace(temp_audio_path_str, final_audio_path)
+
         logger.info(f"Audio processing completed: {final_audio_path}")
         return final_audio_path
 
-    except HTTPException:
-        # Re-raise HTTP exceptions
-        raise
     except Exception as e:
         # Clean up any files on error
-        if 'temp_audio_path_str' in locals() and os.path.exists(temp_audio_path_str):
-            os.remove(temp_audio_path_str)
-        if 'final_audio_path' in locals() and final_audio_path != temp_audio_path_str and os.path.exists(final_audio_path):
-            os.remove(final_audio_path)
+        for path in (temp_audio_path_str, final_audio_path):
+            if path and os.path.exists(path):
+                os.remove(path)
+        if isinstance(e, HTTPException):
+            raise
         logger.error(f"Audio processing failed: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Audio processing failed: {str(e)}")
 
+async def _resolve_audio(audio: Union[UploadFile, str, None], file_prefix: str, **upload_options) -> Optional[str]:
+    """Audio for a pipeline: an upload is processed now, a str is a path already saved at submit time."""
+    if isinstance(audio, str):
+        return audio
+    return await process_audio_upload(audio, file_prefix, **upload_options)
+
+async def _with_timeout(coro, seconds: float, step: str):
+    """Await coro, turning a timeout into a 504 that says which step hung."""
+    # Timed steps are the long ones, so they double as a background job's progress
+    report_progress(step)
+    try:
+        async with async_timeout(seconds):
+            return await coro
+    except asyncio.TimeoutError:
+        logger.error(f"{step} timed out after {seconds}s")
+        raise HTTPException(status_code=504, detail=f"{step} timed out after {seconds} seconds")
+
+def _filename(url: str) -> str:
+    """Bare filename from a full URL, an /images/ or /generated/ path, or a filename."""
+    return posixpath.basename(url) or url
+
+def _image_url(url: str) -> str:
+    """Public URL of a generated image, given a bare filename or a /generated/ path."""
+    return "/images/" + posixpath.basename(url)
+
+def _response_image(img: GeneratedImage) -> dict:
+    return {
+        "url": _image_url(img.url),
+        "caption": img.caption,
+        "age": img.age,
+        "year": img.year,
+        "call_id": img.call_id
+    }
+
+def _summary_image(img: GeneratedImage) -> dict:
+    """Response entry for an image in the video pipelines, which omit call_id."""
+    return {
+        "url": _image_url(img.url),
+        "age": img.age,
+        "year": img.year,
+        "caption": img.caption
+    }
+
+def _response_images(images):
+    """Response entries for images, plus how many of them succeeded, in one pass."""
+    entries = []
+    successful = 0
+    for img in images:
+        entries.append(_response_image(img))
+        if img.url:
+            successful += 1
+    return entries, successful
+
+def _video_url(video_path: str) -> str:
+    return "/generated/" + os.path.basename(video_path)
+
+async def _gather_images_and_audio(images_coro, audio_coro):
+    """Generate images and process audio concurrently; they don't depend on each other."""
+    images_task = asyncio.ensure_future(_with_timeout(images_coro, IMAGE_GENERATION_TIMEOUT, "Image generation"))
+    try:
+        audio_path = await audio_coro
+    except BaseException:
+        # Audio errors are HTTPExceptions about the user's upload, so report those first,
+        # and don't keep paying for images that can no longer be used
+        images_task.cancel()
+        # If the images had already failed, cancel() is a no-op; retrieve the exception
+        # so asyncio doesn't log it as never retrieved
+        images_task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        raise
+    return await images_task, audio_path
+
+def _job_accepted(job_id: str) -> dict:
+    return {
+        "success": True,
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/jobs/{job_id}"
+    }
+
 @app.get("/status")
 async def status_check():
     """Alternative status check endpoint"""
     return {"status": "healthy", "message": "TikTok Aging App API is running"}
 
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status and, once finished, result or error of a background pipeline job"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-Sent Events stream of a job's record: one event now and one per status or step change"""
+    if job_queue.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def _stream():
+        async for job in job_queue.watch(job_id):
+            # Results may be Pydantic models, which orjson can't serialize by itself
+            yield b"data: " + orjson.dumps(jsonable_encoder(job)) + b"\n\n"
+
+    return StreamingResponse(_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 @app.post("/dynamic-aging-video")
 async def dynamic_aging_video(
-    prompt: str = Form(...),
-    num_images: int = Form(3),
-    title: str = Form("My Aging Journey"),
-    name: str = Form("Through the Years"),
-    duration_per_image: float = Form(2.0),
-    transition_duration: float = Form(0.5),
-    audio_file: UploadFile = File(None)
+    body: DynamicVideoRequest = Depends(DynamicVideoRequest.as_form),
+    audio_file: UploadFile = File(None),
+    background: bool = Form(False)
 ):
     """
     NEW: Fully dynamic aging video generator that can handle ANY number of images
@@ -230,8 +512,28 @@ async def dynamic_aging_video(
     - Configurable timing per image
     - Automatic video duration calculation
     - Supports custom audio
+    - background=true returns a job id at once; poll GET /jobs/{job_id} for the result
     """
-    dynamic_id = str(uuid.uuid4())
+    dynamic_id = secrets.token_hex(6)
+    args = (body.prompt, body.num_images, body.title, body.name, body.duration_per_image, body.transition_duration)
+    if background:
+        # The upload is closed once this request returns, so save it before queueing
+        audio_path = await process_audio_upload(audio_file, f"dynamic_{dynamic_id}")
+        job_id = job_queue.enqueue(run_dynamic_aging, dynamic_id, *args, audio_path)
+        return _job_accepted(job_id)
+    return await run_dynamic_aging(dynamic_id, *args, audio_file)
+
+async def run_dynamic_aging(
+    dynamic_id: str,
+    prompt: str,
+    num_images: int,
+    title: str,
+    name: str,
+    duration_per_image: float,
+    transition_duration: float,
+    audio: Union[UploadFile, str, None]
+):
+    """Dynamic aging pipeline behind /dynamic-aging-video, run inline or as a background job."""
     start_time = time.time()
     
     try:
@@ -239,22 +541,18 @@ async def dynamic_aging_video(
         logger.info(f"[{dynamic_id}] Config: {num_images} images, {duration_per_image}s each, {transition_duration}s transitions")
         logger.info(f"[{dynamic_id}] Prompt: '{prompt}', Title: '{title}', Name: '{name}'")
         
-        # Validate inputs
-        if num_images < 1 or num_images > 20:
-            raise HTTPException(status_code=400, detail="Number of images must be between 1 and 20")
-        if duration_per_image < 0.5 or duration_per_image > 10:
-            raise HTTPException(status_code=400, detail="Duration per image must be between 0.5 and 10 seconds")
-        if transition_duration < 0 or transition_duration > 3:
-            raise HTTPException(status_code=400, detail="Transition duration must be between 0 and 3 seconds")
-        
+        # Input ranges are validated by DynamicVideoRequest before we get here
         # Calculate expected video duration
         expected_duration = (num_images * duration_per_image) + ((num_images - 1) * transition_duration) + 2  # +2 for intro/outro
         logger.info(f"[{dynamic_id}] Expected video duration: {expected_duration:.1f} seconds")
         
-        # STEP 1: Generate images with dynamic age distribution
-        logger.info(f"[{dynamic_id}] STEP 1: Generating {num_images} images with dynamic ages...")
+        # STEP 1: Generate images with dynamic age distribution, processing audio alongside
+        logger.info(f"[{dynamic_id}] STEP 1: Generating {num_images} images with dynamic ages and processing audio...")
         
-        generated_images = await openai_service.generate_images_and_captions(prompt, num_images)
+        generated_images, audio_path = await _gather_images_and_audio(
+            openai_service.generate_images_and_captions(prompt, num_images),
+            _resolve_audio(audio, f"dynamic_{dynamic_id}")
+        )
         successful_images = [img for img in generated_images if img.url]
         
         if len(successful_images) < 1:
@@ -262,10 +560,6 @@ async def dynamic_aging_video(
         
         logger.info(f"[{dynamic_id}] Generated {len(successful_images)}/{num_images} images successfully")
         
-        # STEP 2: Handle audio processing with unified function
-        logger.info(f"[{dynamic_id}] Processing audio file...")
-        audio_path = await process_audio_upload(audio_file, f"dynamic_{dynamic_id}")
-        
         if audio_path:
             logger.info(f"[{dynamic_id}] Audio ready: {audio_path}")
         else:
@@ -274,7 +568,7 @@ async def dynamic_aging_video(
         # STEP 3: Render video with dynamic timing
         logger.info(f"[{dynamic_id}] STEP 2: Rendering video with dynamic timing...")
         
-        video_path = await remotion_service.render_video(
+        video_path = await _with_timeout(remotion_service.render_video(
             images=successful_images,
             audio_file=audio_path,
             title=title,
@@ -282,7 +576,7 @@ async def dynamic_aging_video(
             duration_per_image=duration_per_image,
             transition_duration=transition_duration,
             text_transition_duration=1.0
-        )
+        ), RENDER_TIMEOUT, "Video render")
         
         # STEP 4: Calculate final metrics and return
         total_time = time.time() - start_time
@@ -294,7 +588,7 @@ async def dynamic_aging_video(
             "total_time": total_time,
             "images_requested": num_images,
             "images_generated": len(successful_images),
-            "video_url": f"/generated/{os.path.basename(video_path)}",
+            "video_url": _video_url(video_path),
             "video_path": video_path,
             "expected_duration": expected_duration,
             "config": {
@@ -304,15 +598,7 @@ async def dynamic_aging_video(
                 "name": name,
                 "prompt": prompt
             },
-            "images": [
-                {
-                    "url": f"/images/{img.url}",
-                    "age": img.age,
-                    "year": img.year,
-                    "caption": img.caption
-                }
-                for img in successful_images
-            ]
+            "images": list(map(_summary_image, successful_images))
         }
         
         return response
@@ -320,9 +606,7 @@ async def dynamic_aging_video(
     except HTTPException as e:
         raise e
     except Exception as e:
-        logger.error(f"[{dynamic_id}] Error in dynamic_aging_video: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"[{dynamic_id}] Error in dynamic_aging_video: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Dynamic video pipeline failed: {str(e)}")
 
 @app.post("/regenerate-image")
@@ -334,7 +618,7 @@ async def regenerate_image(
     """
     Regenerate a single image at a specific age
     """
-    regen_id = str(uuid.uuid4())
+    regen_id = secrets.token_hex(6)
     
     try:
         logger.info(f"[{regen_id}] Regenerating image for age {age} with prompt: {prompt}")
@@ -348,7 +632,7 @@ async def regenerate_image(
             return {
                 "success": True,
                 "image": {
-                    "url": f"/images/{regenerated_image.url}" if regenerated_image.url and not regenerated_image.url.startswith('/') else f"/images{regenerated_image.url}",
+                    "url": _image_url(regenerated_image.url),
                     "caption": regenerated_image.caption,
                     "age": regenerated_image.age,
                     "year": regenerated_image.year
@@ -376,7 +660,7 @@ async def test_generate_images(
     Generate images for testing/review purposes
     Returns images in format expected by frontend for review
     """
-    test_id = str(uuid.uuid4())
+    test_id = secrets.token_hex(6)
     start_time = time.time()
 
     try:
@@ -387,11 +671,10 @@ async def test_generate_images(
         custom_age_list = None
         if custom_ages:
             try:
-                custom_age_list = json.loads(custom_ages)
+                custom_age_list = AgesIn(ages=custom_ages).ages
                 logger.info(f"[{test_id}] Using custom ages: {custom_age_list}")
-            except json.JSONDecodeError as e:
-                logger.warning(f"[{test_id}] Invalid custom_ages JSON: {e}")
-                custom_age_list = None
+            except ValidationError as e:
+                logger.warning(f"[{test_id}] Invalid custom_ages: {e}")
 
         # Generate images using OpenAI service
         if custom_age_list:
@@ -454,42 +737,32 @@ async def gpt5_iterative_aging(
     """
     Generate images using GPT-5 iterative aging with custom ages
     """
-    custom_id = str(uuid.uuid4())
+    # Parse ages
+    try:
+        age_list = AgesIn(ages=ages).ages
+    except ValidationError:
+        logger.warning(f"Invalid age list: {ages}")
+        raise HTTPException(status_code=400, detail="Between 2 and 20 integer ages from 0 to 120 required")
+
+    custom_id = secrets.token_hex(6)
     start_time = time.time()
     
     try:
-        # Parse ages
-        age_list = [int(age.strip()) for age in ages.split(',')]
-        if len(age_list) < 2:
-            logger.warning(f"[{custom_id}] Invalid age list: {ages}")
-            raise HTTPException(status_code=400, detail="At least 2 ages required")
-        
         logger.info(f"[{custom_id}] GPT-5 Iterative Aging: {prompt}")
         logger.info(f"[{custom_id}] Target ages: {age_list}")
         
         # Generate images using OpenAI service
-        generated_images = await openai_service.generate_images_and_captions(prompt, len(age_list))
+        generated_images = await openai_service.generate_images_and_captions(prompt, len(age_list), custom_ages=age_list)
         
         generation_time = time.time() - start_time
         logger.info(f"[{custom_id}] GPT-5 custom aging completed in {generation_time:.2f} seconds")
         
-        # Calculate generation time
-        generation_time = time.time() - start_time
-        
+        response_images, successful_count = _response_images(generated_images)
         response = {
-            "images": [
-                {
-                    "url": f"/images/{img.url}" if img.url and not img.url.startswith('/') else f"/images{img.url}",
-                    "caption": img.caption,
-                    "age": img.age,
-                    "year": img.year,
-                    "call_id": img.call_id if hasattr(img, 'call_id') else None
-                }
-                for img in generated_images
-            ],
+            "images": response_images,
             "generation_time": generation_time,
             "total_images": len(generated_images),
-            "successful_images": len([img for img in generated_images if img.url]),
+            "successful_images": successful_count,
             "workflow": "gpt5_iterative_aging",
             "target_ages": age_list
         }
@@ -497,7 +770,7 @@ async def gpt5_iterative_aging(
         return response
         
     except Exception as e:
-        print(f"❌ Error in gpt5_iterative_aging: {str(e)}")
+        logger.error(f"[{custom_id}] Error in gpt5_iterative_aging: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 @app.post("/render-aging-video")
@@ -505,47 +778,63 @@ async def render_aging_video(
     images_data: str = Form(...),  # JSON string of image data
     title: str = Form("AI Age Progression"),
     name: str = Form("Generated Person"),
-    audio_file: UploadFile = File(None)
+    audio_file: UploadFile = File(None),
+    background: bool = Form(False)
 ):
     """
     Render video from generated aging images using Remotion
+    - background=true returns a job id at once; poll GET /jobs/{job_id} for the result
     """
-    render_id = str(uuid.uuid4())
+    render_id = secrets.token_hex(6)
+    if background:
+        # The upload is closed once this request returns, so save it before queueing
+        audio_path = await process_audio_upload(audio_file, f"render_{render_id}", require_audio=True)
+        job_id = job_queue.enqueue(run_render_aging, render_id, images_data, title, name, audio_path)
+        return _job_accepted(job_id)
+    return await run_render_aging(render_id, images_data, title, name, audio_file)
+
+async def run_render_aging(
+    render_id: str,
+    images_data: str,
+    title: str,
+    name: str,
+    audio: Union[UploadFile, str, None]
+):
+    """Render pipeline behind /render-aging-video, run inline or as a background job."""
     start_time = time.time()
     
     try:
-        import json
-        
         logger.info(f"[{render_id}] Starting video render request")
         logger.info(f"[{render_id}] Title: '{title}', Name: '{name}'")
         
         # Parse images data
-        images_json = json.loads(images_data)
-        
-        # Convert to GeneratedImage objects
-        images = []
-        for img_data in images_json:
-            if img_data.get('url'):  # Only include successful images
-                # Extract filename from URL (handle both full URLs and relative paths)
-                url = img_data['url']
-                if url.startswith('http'):
-                    # Extract filename from full URL
-                    filename = url.split('/')[-1]
-                elif url.startswith('/images/'):
-                    # Extract filename from relative path
-                    filename = url.split('/')[-1]
-                else:
-                    filename = url
-                
-                image = GeneratedImage(
-                    url=filename,  # Store just the filename
+        try:
+            images_json = orjson.loads(images_data)
+        except orjson.JSONDecodeError as e:
+            raise HTTPException(status_code=400, detail=f"images_data is not valid JSON: {e}")
+        
+        if not isinstance(images_json, list) or not all(
+            isinstance(img_data, dict) and isinstance(img_data.get('url') or '', str)
+            for img_data in images_json
+        ):
+            raise HTTPException(status_code=400, detail="images_data must be a JSON array of image objects with string urls")
+        
+        # Convert to GeneratedImage objects, keeping only successful images
+        _GeneratedImage = GeneratedImage
+        try:
+            images = [
+                _GeneratedImage(
+                    url=_filename(img_data['url']),  # Store just the filename
                     caption=img_data.get('caption', ''),
                     age=img_data.get('age', ''),
                     year=img_data.get('year', ''),
                     call_id=img_data.get('call_id')
                 )
-                images.append(image)
-                logger.info(f"[{render_id}] Processed image: {url} -> {filename}")
+                for img_data in images_json
+                if img_data.get('url')
+            ]
+        except ValidationError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid image in images_data: {e}")
         
         if len(images) < 2:
             logger.warning(f"[{render_id}] Insufficient images: {len(images)}")
@@ -555,7 +844,7 @@ async def render_aging_video(
         
         # Handle audio file with unified processing
         logger.info(f"[{render_id}] Processing audio file...")
-        audio_path = await process_audio_upload(audio_file, f"render_{render_id}")
+        audio_path = await _resolve_audio(audio, f"render_{render_id}")
         
         # Require audio file for video generation
         if not audio_path:
@@ -567,13 +856,13 @@ async def render_aging_video(
         logger.info(f"[{render_id}] Audio ready: {audio_path}")
         
         # Render video using Remotion with dynamic timing
-        print("🎬 Starting video rendering with Remotion...")
+        logger.info(f"[{render_id}] Starting video rendering with Remotion...")
         
         # Calculate timing based on number of images (2 seconds per image)
         duration_per_image = 2.0
         transition_duration = 0.5
         
-        video_path = await remotion_service.render_video(
+        video_path = await _with_timeout(remotion_service.render_video(
             images, 
             audio_path, 
             title, 
@@ -581,16 +870,16 @@ async def render_aging_video(
             duration_per_image=duration_per_image,
             transition_duration=transition_duration,
             text_transition_duration=1.0
-        )
+        ), RENDER_TIMEOUT, "Video render")
         
-        print(f"✅ Video rendered: {video_path}")
+        logger.info(f"[{render_id}] Video rendered: {video_path}")
         
         # Calculate rendering time
         rendering_time = time.time() - start_time
         
         response = {
             "success": True,
-            "video_url": f"/generated/{os.path.basename(video_path)}",
+            "video_url": _video_url(video_path),
             "video_path": video_path,
             "rendering_time": rendering_time,
             "images_used": len(images),
@@ -604,9 +893,7 @@ async def render_aging_video(
     except HTTPException as e:
         raise e
     except Exception as e:
-        logger.error(f"[{render_id}] Error in render_aging_video: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"[{render_id}] Error in render_aging_video: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Video rendering failed: {str(e)}")
 
 @app.post("/complete-aging-pipeline")
@@ -615,13 +902,31 @@ async def complete_aging_pipeline(
     num_images: int = Form(3),
     title: str = Form("AI Age Progression"),
     name: str = Form("Generated Person"),
-    audio_file: UploadFile = File(None)
+    audio_file: UploadFile = File(None),
+    background: bool = Form(False)
 ):
     """
     Complete pipeline: Generate images + Create video in one go
     This is the full end-to-end workflow that users will experience
+    - background=true returns a job id at once; poll GET /jobs/{job_id} for the result
     """
-    pipeline_id = str(uuid.uuid4())
+    pipeline_id = secrets.token_hex(6)
+    if background:
+        # The upload is closed once this request returns, so save it before queueing
+        audio_path = await process_audio_upload(audio_file, f"pipeline_{pipeline_id}")
+        job_id = job_queue.enqueue(run_complete_aging, pipeline_id, prompt, num_images, title, name, audio_path)
+        return _job_accepted(job_id)
+    return await run_complete_aging(pipeline_id, prompt, num_images, title, name, audio_file)
+
+async def run_complete_aging(
+    pipeline_id: str,
+    prompt: str,
+    num_images: int,
+    title: str,
+    name: str,
+    audio: Union[UploadFile, str, None]
+):
+    """Complete pipeline behind /complete-aging-pipeline, run inline or as a background job."""
     start_time = time.time()
     
     try:
@@ -629,12 +934,15 @@ async def complete_aging_pipeline(
         logger.info(f"[{pipeline_id}] Prompt: '{prompt}', Images: {num_images}")
         logger.info(f"[{pipeline_id}] Video: '{title}' by '{name}'")
         
-        # Step 1: Generate aging images using GPT-5 iterative workflow
-        logger.info(f"[{pipeline_id}] Step 1: Generating {num_images} aging images...")
+        # Step 1: Generate aging images using GPT-5 iterative workflow, processing audio alongside
+        logger.info(f"[{pipeline_id}] Step 1: Generating {num_images} aging images and processing audio...")
 
-        generated_images = await openai_service.generate_images_and_captions(
-            prompt=prompt,
-            num_images=num_images
+        generated_images, audio_path = await _gather_images_and_audio(
+            openai_service.generate_images_and_captions(
+                prompt=prompt,
+                num_images=num_images
+            ),
+            _resolve_audio(audio, f"pipeline_{pipeline_id}")
         )
 
         if not generated_images:
@@ -642,30 +950,24 @@ async def complete_aging_pipeline(
 
         logger.info(f"[{pipeline_id}] Generated {len(generated_images)} images successfully")
         
-        # Step 2: Process images into GeneratedImage objects
-        images = []
-        for img_data in generated_images:
-            if img_data.get('url'):
-                # Extract filename from URL
-                url = img_data['url']
-                filename = url.split('/')[-1] if '/' in url else url
-                
-                image = GeneratedImage(
-                    url=filename,  # Store just the filename
-                    caption=img_data.get('caption', ''),
-                    age=str(img_data.get('age', '')),
-                    year=str(img_data.get('year', img_data.get('age', ''))),
-                    call_id=img_data.get('call_id')
-                )
-                images.append(image)
+        # Step 2: Process images into GeneratedImage objects keyed by bare filename
+        _GeneratedImage = GeneratedImage
+        images = [
+            _GeneratedImage(
+                url=_filename(img.url),  # Store just the filename
+                caption=img.caption or '',
+                age=str(img.age or ''),
+                year=str(img.year or img.age or ''),
+                call_id=img.call_id
+            )
+            for img in generated_images
+            if img.url
+        ]
         
         if len(images) < 2:
             raise HTTPException(status_code=400, detail="At least 2 successful images required for video")
         
-        # Step 3: Handle audio file with unified processing (optional for complete pipeline)
-        logger.info(f"[{pipeline_id}] Processing audio file...")
-        audio_path = await process_audio_upload(audio_file, f"pipeline_{pipeline_id}")
-        
+        # Step 3: Audio (optional for complete pipeline) was processed alongside the images
         if audio_path:
             logger.info(f"[{pipeline_id}] Audio ready: {audio_path}")
         else:
@@ -682,7 +984,7 @@ async def complete_aging_pipeline(
             duration_per_image = 2.0
             transition_duration = 0.5
             
-            video_path = await remotion_service.render_video(
+            video_path = await _with_timeout(remotion_service.render_video(
                 images, 
                 audio_path, 
                 title, 
@@ -690,7 +992,7 @@ async def complete_aging_pipeline(
                 duration_per_image=duration_per_image,
                 transition_duration=transition_duration,
                 text_transition_duration=1.0
-            )
+            ), RENDER_TIMEOUT, "Video render")
             
             logger.info(f"[{pipeline_id}] Complete pipeline with video completed in {total_time:.1f}s")
             
@@ -701,20 +1003,12 @@ async def complete_aging_pipeline(
                 "image_generation_time": 0,  # TODO: Track image generation time separately
                 "video_rendering_time": total_time,
                 "images_generated": len(images),
-                "video_url": f"/generated/{os.path.basename(video_path)}",
+                "video_url": _video_url(video_path),
                 "video_path": video_path,
                 "title": title,
                 "name": name,
                 "prompt": prompt,
-                "images": [
-                    {
-                        "url": f"/images/{img.url}",
-                        "age": img.age,
-                        "year": img.year,
-                        "caption": img.caption
-                    }
-                    for img in images
-                ]
+                "images": list(map(_summary_image, images))
             }
         else:
             # Return images only for manual workflow
@@ -731,15 +1025,7 @@ async def complete_aging_pipeline(
                 "prompt": prompt,
                 "workflow": "images_only",
                 "message": "Images generated successfully. Please proceed to select your favorites and add audio.",
-                "images": [
-                    {
-                        "url": f"/images/{img.url}",
-                        "age": img.age,
-                        "year": img.year,
-                        "caption": img.caption
-                    }
-                    for img in images
-                ]
+                "images": list(map(_summary_image, images))
             }
         
         return response
@@ -747,35 +1033,63 @@ async def complete_aging_pipeline(
     except HTTPException as e:
         raise e
     except Exception as e:
-        logger.error(f"[{pipeline_id}] Error in complete pipeline: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"[{pipeline_id}] Error in complete pipeline: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Complete pipeline failed: {str(e)}")
 
+# Audio is required here and, to keep this endpoint's original behavior, not validated
+_GENERATE_AND_RENDER_AUDIO = {"require_audio": True, "validate_and_convert": False}
+
 @app.post("/generate-and-render-video")
 async def generate_and_render_video(
     prompt: str = Form(...),
     num_images: int = Form(3),
     title: str = Form("AI Age Progression"),
     name: str = Form("Generated Person"),
-    audio_file: UploadFile = File(None)
+    audio_file: UploadFile = File(None),
+    background: bool = Form(False)
 ):
     """
     Complete workflow: Generate images with GPT-5 iterative aging AND render video
+    - background=true returns a job id at once; poll GET /jobs/{job_id} for the result
     """
+    workflow_id = secrets.token_hex(6)
+    if background:
+        # The upload is closed once this request returns, so save it before queueing
+        audio_path = await process_audio_upload(audio_file, f"render_{workflow_id}", **_GENERATE_AND_RENDER_AUDIO)
+        job_id = job_queue.enqueue(run_generate_and_render, workflow_id, prompt, num_images, title, name, audio_path)
+        return _job_accepted(job_id)
+    return await run_generate_and_render(workflow_id, prompt, num_images, title, name, audio_file)
+
+async def run_generate_and_render(
+    workflow_id: str,
+    prompt: str,
+    num_images: int,
+    title: str,
+    name: str,
+    audio: Union[UploadFile, str, None]
+):
+    """Pipeline behind /generate-and-render-video, run inline or as a background job."""
     start_time = time.time()
     
     try:
-        print(f"🚀 Complete Workflow: Generate + Render Video")
-        print(f"📝 Prompt: {prompt}")
-        print(f"🎯 Images: {num_images}, Title: {title}, Name: {name}")
-        
-        # Step 1: Generate images
-        print("🎨 Step 1: Generating images with GPT-5 iterative aging...")
-        generated_images = await openai_service.generate_images_and_captions(prompt, num_images)
+        logger.info(f"[{workflow_id}] Complete Workflow: Generate + Render Video")
+        logger.info(f"[{workflow_id}] Prompt: {prompt}")
+        logger.info(f"[{workflow_id}] Images: {num_images}, Title: {title}, Name: {name}")
+        
+        # Step 1: Generate images, handling audio using unified function alongside
+        logger.info(f"[{workflow_id}] Step 1: Generating images with GPT-5 iterative aging...")
+        generated_images, audio_path = await _gather_images_and_audio(
+            openai_service.generate_images_and_captions(prompt, num_images),
+            _resolve_audio(audio, f"render_{workflow_id}", **_GENERATE_AND_RENDER_AUDIO)
+        )
         
-        # Filter successful images
-        successful_images = [img for img in generated_images if img.url]
+        # Filter successful images, building their response entries in the same pass
+        successful_images = []
+        response_images = []
+        for img in generated_images:
+            if img.url:
+                successful_images.append(img)
+                response_images.append(_response_image(img))
         
         if len(successful_images) < 2:
             raise HTTPException(
@@ -783,24 +1097,16 @@ async def generate_and_render_video(
                 detail=f"Not enough successful images generated. Got {len(successful_images)}, need at least 2"
             )
         
-        print(f"✅ Step 1 Complete: Generated {len(successful_images)} successful images")
-        
-        # Step 2: Handle audio using unified function
-        audio_path = await process_audio_upload(
-            audio_file,
-            f"render_{str(uuid.uuid4())[:8]}",
-            require_audio=True,
-            validate_and_convert=False  # Skip validation for this endpoint to maintain original behavior
-        )
+        logger.info(f"[{workflow_id}] Step 1 Complete: Generated {len(successful_images)} successful images")
         
         # Step 3: Render video with dynamic timing
-        print("🎬 Step 2: Rendering video with Remotion...")
+        logger.info(f"[{workflow_id}] Step 2: Rendering video with Remotion...")
         
         # Use default timing but allow for dynamic expansion
         duration_per_image = 2.0
         transition_duration = 0.5
         
-        video_path = await remotion_service.render_video(
+        video_path = await _with_timeout(remotion_service.render_video(
             successful_images, 
             audio_path, 
             title, 
@@ -808,9 +1114,9 @@ async def generate_and_render_video(
             duration_per_image=duration_per_image,
             transition_duration=transition_duration,
             text_transition_duration=1.0
-        )
+        ), RENDER_TIMEOUT, "Video render")
         
-        print(f"✅ Step 2 Complete: Video rendered successfully")
+        logger.info(f"[{workflow_id}] Step 2 Complete: Video rendered successfully")
         
         # Calculate total time
         total_time = time.time() - start_time
@@ -818,18 +1124,9 @@ async def generate_and_render_video(
         # Return complete response
         response = {
             "success": True,
-            "video_url": f"/generated/{os.path.basename(video_path)}",
+            "video_url": _video_url(video_path),
             "video_path": video_path,
-            "images": [
-                {
-                    "url": f"/images/{img.url}" if img.url and not img.url.startswith('/') else f"/images{img.url}",
-                    "caption": img.caption,
-                    "age": img.age,
-                    "year": img.year,
-                    "call_id": img.call_id if hasattr(img, 'call_id') else None
-                }
-                for img in generated_images
-            ],
+            "images": response_images,
             "total_time": total_time,
             "images_generated": len(generated_images),
             "successful_images": len(successful_images),
@@ -844,9 +1141,7 @@ async def generate_and_render_video(
     except HTTPException as e:
         raise e
     except Exception as e:
-        print(f"❌ Error in generate_and_render_video: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"[{workflow_id}] Error in generate_and_render_video: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Complete workflow failed: {str(e)}")
 
 @app.post("/generate-video", response_model=VideoGenerationResponse)
@@ -856,44 +1151,58 @@ async def generate_video(
     title: str = Form("AI Generated Journey"),
     name: str = Form("Generated Person"),
     images_data: str = Form(...),  # JSON string of accepted images
-    audio_file: Optional[UploadFile] = File(None)  # Make audio optional
+    audio_file: Optional[UploadFile] = File(None),  # Make audio optional
+    background: bool = Form(False)
 ):
     """
     Generate a video with AI-generated images based on the prompt
     Audio is optional - will use default if not provided
+    - background=true returns a job id at once; poll GET /jobs/{job_id} for the result
     """
+    # Validate inputs
+    if num_images < 2 or num_images > 10:
+        raise HTTPException(status_code=400, detail="Number of images must be between 2 and 10")
+
+    generate_id = secrets.token_hex(6)
+    if background:
+        # The upload is closed once this request returns, so save it before queueing
+        audio_path = await process_audio_upload(audio_file, f"generate_{generate_id}")
+        job_id = job_queue.enqueue(run_generate_video, generate_id, images_data, title, name, audio_path)
+        return _job_accepted(job_id)
+    return await run_generate_video(generate_id, images_data, title, name, audio_file)
+
+async def run_generate_video(
+    generate_id: str,
+    images_data: str,
+    title: str,
+    name: str,
+    audio: Union[UploadFile, str, None]
+):
+    """Render pipeline behind /generate-video, run inline or as a background job."""
     start_time = time.time()
 
     try:
-        # Validate inputs
-        if num_images < 2 or num_images > 10:
-            raise HTTPException(status_code=400, detail="Number of images must be between 2 and 10")
 
-        # Parse images data
+        # Parse and validate images data in one pass
         try:
-            accepted_images = json.loads(images_data)
-            print(f"Received {len(accepted_images)} images from frontend")
-        except json.JSONDecodeError as e:
+            successful_images = GENERATED_IMAGE_LIST_ADAPTER.validate_json(images_data)
+            logger.info(f"[{generate_id}] Received {len(successful_images)} images from frontend")
+        except ValidationError as e:
             raise HTTPException(status_code=400, detail=f"Invalid images_data format: {str(e)}")
 
-        if len(accepted_images) < 2:
+        if len(successful_images) < 2:
             raise HTTPException(status_code=400, detail="At least 2 images required for video generation")
 
         # Handle audio file using unified function
-        audio_path = await process_audio_upload(
-            audio_file,
-            f"generate_{uuid.uuid4().hex[:8]}",
-            require_audio=False,
-            validate_and_convert=True
-        )
+        audio_path = await _resolve_audio(audio, f"generate_{generate_id}")
 
         # Extract filename for response
         audio_filename = ""
         if audio_path:
             audio_filename = os.path.basename(audio_path)
-            print(f"Audio file processed: {audio_filename}")
+            logger.info(f"[{generate_id}] Audio file processed: {audio_filename}")
         else:
-            print("No audio file provided - will use default audio")
+            logger.info(f"[{generate_id}] No audio file provided - will use default audio")
 
         # Use default audio if none provided
         if not audio_path:
@@ -904,32 +1213,11 @@ async def generate_video(
             )
 
         # Use the accepted images instead of generating new ones
-        print(f"Using {len(accepted_images)} accepted images for video")
-
-        # Convert dictionaries to GeneratedImage objects
-        successful_images = []
-        for img_data in accepted_images:
-            if isinstance(img_data, dict) and 'url' in img_data:
-                img_obj = GeneratedImage(
-                    url=img_data['url'],
-                    caption=img_data.get('caption', ''),
-                    age=str(img_data.get('age', '')),
-                    year=str(img_data.get('year', '')),
-                    call_id=img_data.get('call_id'),
-                    base64_data=img_data.get('base64_data')
-                )
-                successful_images.append(img_obj)
-            else:
-                print(f"Skipping invalid image data: {img_data}")
-
-        if len(successful_images) < 2:
-            raise HTTPException(status_code=400, detail="At least 2 valid images required for video generation")
-
-        print(f"Converted {len(successful_images)} images to GeneratedImage objects")
+        logger.info(f"[{generate_id}] Using {len(successful_images)} accepted images for video")
 
         # Render video using Remotion
-        print("Starting video rendering with Remotion...")
-        video_path = await remotion_service.render_video(
+        logger.info(f"[{generate_id}] Starting video rendering with Remotion...")
+        video_path = await _with_timeout(remotion_service.render_video(
             successful_images, 
             audio_path, 
             title, 
@@ -937,19 +1225,21 @@ async def generate_video(
             duration_per_image=2.0,
             transition_duration=0.5,
             text_transition_duration=1.0
-        )
+        ), RENDER_TIMEOUT, "Video render")
 
-        print(f"Video rendered: {video_path}")
+        logger.info(f"[{generate_id}] Video rendered: {video_path}")
 
         # Calculate generation time
         generation_time = time.time() - start_time
 
         # Return response
+        num_rendered = len(successful_images)
         response = VideoGenerationResponse(
-            video_url=f"/generated/{os.path.basename(video_path)}",
+            video_url=_video_url(video_path),
             images=successful_images,
             audio_file=audio_filename,
-            generation_time=generation_time
+            generation_time=generation_time,
+            video_duration=num_rendered * 2.0 + (num_rendered - 1) * 0.5 + 2  # +2 for intro/outro
         )
 
         return response
@@ -957,9 +1247,7 @@ async def generate_video(
     except HTTPException as e:
         raise e
     except Exception as e:
-        print(f"Error in generate_video: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"[{generate_id}] Error in generate_video: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 @app.get("/download-video/{filename}")
@@ -967,15 +1255,19 @@ async def download_video(filename: str):
     """
     Download the generated video file
     """
-    file_path = os.path.join("generated", filename)
+    file_path = os.path.join(GENERATED_DIR, filename)
     
-    if not os.path.exists(file_path):
+    # One stat for the existence check, reused by FileResponse instead of statting again
+    try:
+        stat_result = os.stat(file_path)
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Video file not found")
     
     return FileResponse(
         path=file_path,
         media_type='video/mp4',
         filename=filename,
+        stat_result=stat_result,
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
@@ -987,15 +1279,15 @@ async def test_audio_upload(
     Test endpoint for audio upload functionality
     Validates and processes audio files, returns detailed information
     """
-    test_id = str(uuid.uuid4())
+    if not audio_file or not audio_file.filename:
+        raise HTTPException(status_code=400, detail="No audio file provided")
+
+    test_id = secrets.token_hex(6)
     start_time = time.time()
     
     try:
         logger.info(f"[{test_id}] Testing audio upload: {audio_file.filename}")
         
-        if not audio_file or not audio_file.filename:
-            raise HTTPException(status_code=400, detail="No audio file provided")
-        
         # Process audio file using unified function
         final_audio_path = await process_audio_upload(
             audio_file,
@@ -1009,21 +1301,22 @@ async def test_audio_upload(
         file_size_mb = file_size / (1024 * 1024)
 
         # Get validation info for response
-        validation = audio_processor.validate_audio(final_audio_path)
+        validation = await audio_processor.run_blocking(audio_processor.validate_audio, final_audio_path)
 
         processing_time = time.time() - start_time
+        saved_filename = os.path.basename(final_audio_path)
 
         response = {
             "success": True,
             "test_id": test_id,
             "original_filename": audio_file.filename,
-            "saved_filename": os.path.basename(final_audio_path),
+            "saved_filename": saved_filename,
             "file_path": final_audio_path,
             "file_size_bytes": file_size,
             "file_size_mb": round(file_size_mb, 2),
             "processing_time": round(processing_time, 3),
             "validation": validation,
-            "audio_url": f"/uploads/{os.path.basename(final_audio_path)}",
+            "audio_url": f"/uploads/{saved_filename}",
             "message": "Audio file uploaded and processed successfully"
         }
         
@@ -1033,17 +1326,17 @@ async def test_audio_upload(
     except HTTPException as e:
         raise e
     except Exception as e:
-        logger.error(f"[{test_id}] Error in test_audio_upload: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"[{test_id}] Error in test_audio_upload: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Audio upload test failed: {str(e)}")
 
-@app.get("/health")
-async def health_check():
-    """
-    Health check endpoint
-    """
-    # Check if required directories exist
+@app.on_event("startup")
+async def prepare_health():
+    # Create missing directories
+    os.makedirs("generated", exist_ok=True)
+    os.makedirs("uploads", exist_ok=True)
+    os.makedirs("../generated", exist_ok=True)
+    
+    # Check required directories after creating them, since this payload is cached
     directories = {
         "generated": os.path.exists("generated"),
         "uploads": os.path.exists("uploads"),
@@ -1051,12 +1344,7 @@ async def health_check():
         "public_images": os.path.exists("../generated")
     }
     
-    # Create missing directories
-    os.makedirs("generated", exist_ok=True)
-    os.makedirs("uploads", exist_ok=True)
-    os.makedirs("../generated", exist_ok=True)
-    
-    return {
+    app.state.health = {
         "status": "healthy",
         "openai_configured": bool(os.getenv("OPENAI_API_KEY")),
         "remotion_path": os.getenv("REMOTION_PROJECT_PATH", "../"),
@@ -1064,7 +1352,17 @@ async def health_check():
         "workflow": "step_by_step_enabled"
     }
 
+@app.get("/health")
+async def health_check():
+    """
+    Health check endpoint
+    """
+    # Built once at startup; nothing in it changes while the server runs
+    return app.state.health
+
 # Backend API only - no frontend serving
 if __name__ == "__main__":
     import uvicorn
+    # uvicorn[standard] brings uvloop and httptools, which uvicorn picks up on its own.
+    # check_single_process (startup) refuses WEB_CONCURRENCY > 1
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -3,6 +3,7 @@
 
 // Note: When using the Node.JS APIs, the config file doesn't apply. Instead, pass options directly to the APIs
 
+import os from "node:os";
 import { Config } from "@remotion/cli/config";
 import { enableTailwind } from '@remotion/tailwind-v4';
 
@@ -14,8 +15,12 @@ Config.setDelayRenderTimeoutInMilliseconds(10000); // 10 seconds max for delayRe
 Config.setTimeoutInMilliseconds(120000); // 2 minutes total render timeout
 
 // Memory and performance optimizations
-Config.setChromiumOpenGlRenderer("swangle"); // Use software rendering instead of EGL
-Config.setConcurrency(1); // Single thread to prevent memory issues
+// Software rendering is the safe default for headless servers; set
+// REMOTION_USE_GPU=1 to let Remotion use hardware GL instead
+if (process.env.REMOTION_USE_GPU !== "1") {
+  Config.setChromiumOpenGlRenderer("swangle");
+}
+Config.setConcurrency(Math.max(1, Math.min(Math.floor(os.cpus().length / 2), 4))); // ~half the cores, capped at 4
 
 // Enable Tailwind
 Config.overrideWebpackConfig(enableTailwind);
@@ -0,0 +1,149 @@
+// Long-lived render worker used by backend/app/remotion_service.py.
+//
+// Bundles the project once and keeps a pool of Chromium instances open, so a
+// render request does not pay for Node startup, webpack and a browser launch.
+//
+// Protocol (one JSON object per line):
+//   stdin:  {"id": "...", "props": {...}, "output": "/abs/path.mp4"}
+//           {"cancel": "<id>"}
+//   stdout: lines starting with "@@remotion-worker " followed by JSON:
+//           {"ready": true} once, then {"id": "...", "ok": true} or
+//           {"id": "...", "ok": false, "error": "..."} per job.
+// Any other stdout/stderr output is Remotion logging.
+
+import fs from "node:fs";
+import os from "node:os";
+import path from "node:path";
+import readline from "node:readline";
+import { bundle } from "@remotion/bundler";
+import {
+  makeCancelSignal,
+  openBrowser,
+  renderMedia,
+  selectComposition,
+} from "@remotion/renderer";
+import { enableTailwind } from "@remotion/tailwind-v4";
+
+const PREFIX = "@@remotion-worker ";
+const COMPOSITION_ID = "DynamicAgedReel";
+
+// remotion.config.ts is not read by the Node APIs, so mirror its settings here.
+// REMOTION_USE_GPU=1 leaves the GL backend to Remotion instead of swangle.
+const chromiumOptions =
+  process.env.REMOTION_USE_GPU === "1" ? {} : { gl: "swangle" };
+const delayRenderTimeout = 10000;
+
+const cpus = os.cpus().length;
+const poolSize = Math.max(
+  1,
+  Number(process.env.REMOTION_BROWSER_POOL) || Math.min(cpus, 4),
+);
+// Split the cores between renders that may run at the same time, unless
+// REMOTION_CONCURRENCY sets each render's frame concurrency explicitly
+const concurrency =
+  Number(process.env.REMOTION_CONCURRENCY) ||
+  Math.max(1, Math.floor(cpus / poolSize));
+
+const send = (msg) => process.stdout.write(PREFIX + JSON.stringify(msg) + "\n");
+
+const projectDir = process.cwd();
+const publicDir = path.join(projectDir, "public");
+fs.mkdirSync(publicDir, { recursive: true });
+
+const serveUrl = await bundle({
+  entryPoint: path.join(projectDir, "src", "index.ts"),
+  webpackOverride: enableTailwind,
+});
+
+// bundle() snapshots public/ at bundle time, but images and audio are staged
+// there per request; point the bundle at the live directory instead.
+const bundledPublic = path.join(serveUrl, "public");
+fs.rmSync(bundledPublic, { recursive: true, force: true });
+fs.symlinkSync(publicDir, bundledPublic, "junction");
+
+const browsers = await Promise.all(
+  Array.from({ length: poolSize }, () =>
+    openBrowser("chrome", { chromiumOptions }),
+  ),
+);
+const idle = [...browsers];
+const waiting = [];
+const cancels = new Map();
+
+const acquire = () =>
+  idle.length > 0
+    ? Promise.resolve(idle.pop())
+    : new Promise((resolve) => waiting.push(resolve));
+
+const release = (browser) => {
+  const next = waiting.shift();
+  if (next) {
+    next(browser);
+  } else {
+    idle.push(browser);
+  }
+};
+
+const render = async ({ id, props, output }) => {
+  const { cancelSignal, cancel } = makeCancelSignal();
+  cancels.set(id, cancel);
+  const browser = await acquire();
+  try {
+    const composition = await selectComposition({
+      serveUrl,
+      id: COMPOSITION_ID,
+      inputProps: props,
+      puppeteerInstance: browser,
+      chromiumOptions,
+      timeoutInMilliseconds: delayRenderTimeout,
+    });
+    await renderMedia({
+      serveUrl,
+      composition,
+      codec: "h264",
+      outputLocation: output,
+      inputProps: props,
+      puppeteerInstance: browser,
+      chromiumOptions,
+      imageFormat: "jpeg",
+      concurrency,
+      overwrite: true,
+      timeoutInMilliseconds: delayRenderTimeout,
+      cancelSignal,
+    });
+    send({ id, ok: true });
+  } catch (err) {
+    send({ id, ok: false, error: String(err && err.stack ? err.stack : err) });
+  } finally {
+    cancels.delete(id);
+    release(browser);
+  }
+};
+
+const shutdown = async () => {
+  await Promise.allSettled(browsers.map((b) => b.close({ silent: true })));
+  process.exit(0);
+};
+
+const lines = readline.createInterface({ input: process.stdin });
+lines.on("line", (line) => {
+  if (!line.trim()) {
+    return;
+  }
+  let msg;
+  try {
+    msg = JSON.parse(line);
+  } catch (err) {
+    console.error(`render-worker: ignoring malformed request: ${err}`);
+    return;
+  }
+  if (msg.cancel) {
+    cancels.get(msg.cancel)?.();
+  } else {
+    render(msg);
+  }
+});
+// The backend closing stdin means it has gone away
+lines.on("close", shutdown);
+
+send({ ready: true, poolSize, concurrency });